@@ -1,36 +1,76 @@
 import streamlit as st
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import plotly.io as pio
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
 import pandas as pd
 import requests
-from database_manager import DatabaseManager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from database_manager import DatabaseManager, since_hours
 from trading import UpbitTradeExecutor  # BithumbTradeExecutor 추가
 import os
+import textwrap
 from dotenv import load_dotenv
 import pyupbit
 
 load_dotenv()
 
+# 차트를 브라우저로 보낼 때 Figure JSON 직렬화에 orjson 사용
+pio.json.config.default_engine = 'orjson'
+
 try:
     INVESTMENT = float(os.getenv('INVESTMENT'))
 except TypeError:
     raise ValueError("INVESTMENT 환경변수가 설정되지 않았습니다. .env 파일을 확인해주세요.")
     
-trader = UpbitTradeExecutor()
-balance = trader.get_balance()
 symbol = os.getenv('COIN', 'BTC')
 market = f"KRW-{symbol}"
 
+# 업비트 조회 결과 캐시 시간(초) - 짧은 간격의 재실행/위젯 조작마다 REST 호출하지 않도록 함
+ACCOUNT_CACHE_TTL = 5
+# 거래 내역/분석 결과 DB 조회 캐시 시간(초) - 탭과 사이드바가 같은 조회를 반복하지 않도록 함
+DB_CACHE_TTL = 10
+# 분석 히스토리에 표시할 최근 항목 수
+ANALYSIS_HISTORY_SIZE = 15
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    """DB 매니저를 한 번만 생성 (테이블 확인/연결 설정을 재실행마다 반복하지 않음)
+
+    Streamlit은 재실행마다 새 스레드에서 스크립트를 돌리므로 스레드별 연결 대신 연결 하나를 공유
+    """
+    return DatabaseManager(shared_connection=True)
+
+@st.cache_resource(show_spinner=False)
+def get_io_executor():
+    """서로 독립적인 조회(업비트 API, DB)를 겹쳐서 실행하기 위한 스레드 풀"""
+    return ThreadPoolExecutor(max_workers=4)
+
+@st.cache_resource(show_spinner=False)
+def get_trader():
+    """거래 실행기를 한 번만 생성해서 모든 재실행에서 재사용"""
+    return UpbitTradeExecutor()
+
+@st.cache_data(ttl=ACCOUNT_CACHE_TTL, show_spinner=False)
+def _fetch_balance():
+    """계좌 잔고 조회 (캐시)"""
+    return get_trader().get_balance()
+
+@st.cache_data(ttl=ACCOUNT_CACHE_TTL, show_spinner=False)
+def _fetch_price(market):
+    """현재가 조회 (캐시)"""
+    return pyupbit.get_current_price(market)
+
 def get_account_balance():
     """계좌 잔고 및 수익률 정보 조회"""
     try:
-        trader = UpbitTradeExecutor()
-        symbol = os.getenv('COIN', 'BTC')
-        balance = trader.get_balance()
+        balance = _fetch_balance()
         
         # 현재가 조회
-        current_price = pyupbit.get_current_price(f"KRW-{symbol}")
+        current_price = _fetch_price(market)
         
         # 코인 보유량
         coin_available = float(balance[f'{symbol.lower()}_available'])
@@ -59,185 +99,241 @@ def get_account_balance():
         print(f"잔고 조회 중 오류 발생: {e}")
         return None
 
-def get_current_position(self) -> dict:
-    """현재 포지션 정보 조회"""
-    try:
-        # 잔고 조회
-        balance = self.get_balance()
-        symbol = os.getenv('COIN', 'BTC')  # 환경변수에서 코인 심볼 가져오기
-        
-        # 현재가 조회
-        market_url = f"https://api.bithumb.com/public/ticker/{symbol}_KRW"
-        market_response = requests.get(market_url).json()
-        current_price = float(market_response['data']['closing_price'])
-        
-        # 코인 가치 및 총 자산가치 계산
-        coin_quantity = float(balance[f'{symbol.lower()}_available'])
-        coin_value = coin_quantity * current_price
-        total_value = coin_value + float(balance['krw_available'])
-        
-        # 평균 매수가 계산 (코인 보유 시)
-        avg_price = 0
-        if coin_quantity > 0:
-            try:
-                investment_per_coin = float(os.getenv('INVESTMENT')) / coin_quantity
-                avg_price = investment_per_coin
-            except:
-                avg_price = current_price  # 평균 매수가 계산 실패 시 현재가로 대체
-        
-        # 수익률 계산
-        try:
-            investment = float(os.getenv('INVESTMENT'))
-            profit = total_value - investment
-            profit_rate = ((total_value - investment) / investment) * 100
-        except:
-            profit = 0
-            profit_rate = 0
-            
-        return {
-            'quantity': coin_quantity,
-            'avg_price': avg_price,
-            'current_price': current_price,
-            'total_value': total_value,
-            'profit_amount': profit,
-            'profit_rate': profit_rate,
-            'krw_available': float(balance['krw_available'])
-        }
-        
-    except Exception as e:
-        print(f"포지션 정보 조회 중 오류 발생: {e}")
-        return {
-            'quantity': 0,
-            'avg_price': 0,
-            'current_price': 0,
-            'total_value': 0,
-            'profit_amount': 0,
-            'profit_rate': 0,
-            'krw_available': 0
-        }
-    
+# 메트릭 카드 스타일 (4개 카드를 한 줄 그리드로 배치)
+METRICS_CSS = """
+<style>
+.metric-grid {
+    display: grid;
+    grid-template-columns: repeat(4, 1fr);
+    gap: 1rem;
+}
+.metric-container {
+    text-align: center;
+    padding: 10px;
+}
+.metric-label {
+    font-size: 1rem;
+    color: rgb(153, 153, 153);
+    font-weight: 600;
+    text-transform: uppercase;
+}
+.metric-value {
+    font-size: 2rem !important;
+    font-weight: 600;
+    color: rgb(255, 255, 255);
+}
+.profit-positive {
+    color: #3D9970 !important;
+    font-size: 2rem !important;
+}
+.profit-negative {
+    color: #FF4136 !important;
+    font-size: 2rem !important;
+}
+</style>
+"""
+
 def display_metrics():
     """메트릭 정보를 표시하는 함수"""
     balance_info = get_account_balance()
     
     if balance_info:
-        # CSS 스타일 정의
-        st.markdown("""
-        <style>
-        .metric-container {
-            text-align: center;
-            padding: 10px;
-        }
-        .metric-label {
-            font-size: 1rem;
-            color: rgb(153, 153, 153);
-            font-weight: 600;
-            text-transform: uppercase;
-        }
-        .metric-value {
-            font-size: 2rem !important;
-            font-weight: 600;
-            color: rgb(255, 255, 255);
-        }
-        .profit-positive {
-            color: #3D9970 !important;
-            font-size: 2rem !important;
-        }
-        .profit-negative {
-            color: #FF4136 !important;
-            font-size: 2rem !important;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        cols = st.columns(4)
+        profit_rate = balance_info['profit_rate']
         
-        # 총 자산
-        with cols[0]:
-            st.markdown(f"""
+        # 스타일과 카드 4개(총 자산, 현재 수익, 수익률, KRW 잔액)를 한 번의 markdown으로 전송
+        st.markdown(METRICS_CSS + textwrap.dedent(f"""
+        <div class="metric-grid">
             <div class="metric-container">
                 <div class="metric-label">총 자산</div>
                 <div class="metric-value">₩{balance_info['total_value']:,.0f}</div>
             </div>
-            """, unsafe_allow_html=True)
-        
-        # 현재 수익
-        with cols[1]:
-            st.markdown(f"""
             <div class="metric-container">
                 <div class="metric-label">현재 수익</div>
                 <div class="metric-value">₩{balance_info['profit']:,.0f}</div>
             </div>
-            """, unsafe_allow_html=True)
-        
-        # 수익률
-        with cols[2]:
-            profit_rate = balance_info['profit_rate']
-            st.markdown(f"""
             <div class="metric-container">
                 <div class="metric-label">수익률</div>
                 <div class="{'profit-positive' if profit_rate >= 0 else 'profit-negative'}">
                     {profit_rate:+.2f}%
                 </div>
             </div>
-            """, unsafe_allow_html=True)
-        
-        # KRW 잔액
-        with cols[3]:
-            st.markdown(f"""
             <div class="metric-container">
                 <div class="metric-label">KRW 잔액</div>
                 <div class="metric-value">₩{balance_info['krw_available']:,.0f}</div>
             </div>
-            """, unsafe_allow_html=True)
-
-def get_upbit_candle_data(interval='minute1', count=100):
-    """업비트 API에서 실시간 캔들 데이터 조회"""
+        </div>
+        """), unsafe_allow_html=True)
+
+# 화면의 캔들 간격 -> 업비트 캔들 API 경로
+CANDLE_INTERVAL_MAP = {
+    '1m': 'minutes/1',
+    '3m': 'minutes/3',
+    '5m': 'minutes/5',
+    '10m': 'minutes/10',
+    '30m': 'minutes/30',
+    '1h': 'minutes/60',
+    '6h': 'minutes/360',
+    '12h': 'minutes/720',
+    '24h': 'days'
+}
+UPBIT_CANDLE_URL = "https://api.upbit.com/v1/candles/{path}"
+
+# 새로고침마다 새 TLS 연결을 맺지 않도록 업비트 API 연결을 재사용
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+def _fetch_candles(interval, count):
+    """업비트 캔들 API를 직접 호출해서 캔들 데이터 조회
+
+    pyupbit.get_ohlcv처럼 dict 목록으로 DataFrame을 만든 뒤 이름을 바꾸지 않고,
+    필요한 열만 float64 배열로 바로 구성합니다.
+    """
+    path = CANDLE_INTERVAL_MAP.get(interval, 'minutes/1')
+    response = http_session.get(
+        UPBIT_CANDLE_URL.format(path=path),
+        params={'market': market, 'count': count},
+        timeout=(3, 10)
+    )
+    response.raise_for_status()
+    rows = orjson.loads(response.content)[::-1]  # API는 최신순으로 반환 -> 시간순으로 정렬
+    
+    if not rows:
+        return pd.DataFrame()
+    
+    def float_column(key):
+        return np.fromiter((row[key] for row in rows), dtype=np.float64, count=len(rows))
+    
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime([row['candle_date_time_kst'] for row in rows], format='ISO8601'),
+        'opening_price': float_column('opening_price'),
+        'high_price': float_column('high_price'),
+        'low_price': float_column('low_price'),
+        'closing_price': float_column('trade_price'),
+        'acc_trade_volume': float_column('candle_acc_trade_volume')
+    })
+
+def get_upbit_candle_data(interval='1m', count=100):
+    """업비트 API에서 실시간 캔들 데이터 조회
+    
+    처음(또는 간격/개수 변경 시)에만 전체 캔들을 받고, 이후 새로고침에서는
+    최근 2개 캔들만 받아 세션에 보관한 데이터의 마지막 부분을 갱신합니다.
+    """
     try:
-        # interval 변환
-        interval_map = {
-            '1m': 'minute1',
-            '3m': 'minute3',
-            '5m': 'minute5',
-            '10m': 'minute10',
-            '30m': 'minute30',
-            '1h': 'minute60',
-            '6h': 'minute360',
-            '12h': 'minute720',
-            '24h': 'day'
-        }
+        cache_key = (interval, count)
+        cached_df = st.session_state.get('market_df')
         
-        upbit_interval = interval_map.get(interval, 'minute1')
-        df = pyupbit.get_ohlcv(market, interval=upbit_interval, count=count)
+        if cached_df is not None and st.session_state.get('market_df_key') == cache_key:
+            latest_df = _fetch_candles(interval, 2)
+            # 마지막 조회 이후 캔들이 2개 넘게 지나간 경우에는 전체를 다시 받음
+            if not latest_df.empty and latest_df['timestamp'].iloc[0] <= cached_df['timestamp'].iloc[-1]:
+                df = (
+                    pd.concat([cached_df, latest_df])
+                    .drop_duplicates(subset='timestamp', keep='last')
+                    .tail(count)
+                    .reset_index(drop=True)
+                )
+            else:
+                df = _fetch_candles(interval, count)
+        else:
+            df = _fetch_candles(interval, count)
         
-        if df is not None:
-            df = df.reset_index()
-            df = df.rename(columns={
-                'index': 'timestamp',
-                'open': 'opening_price',
-                'high': 'high_price',
-                'low': 'low_price',
-                'close': 'closing_price',
-                'volume': 'acc_trade_volume'
-            })
-            return df
+        if not df.empty:
+            st.session_state.market_df = df
+            st.session_state.market_df_key = cache_key
+        return df
             
     except Exception as e:
         print(f"업비트 API 호출 중 오류 발생: {e}")
         return pd.DataFrame()
 
-def create_trading_chart(market_df, trade_df):
-    """거래 내역이 포함된 BTC 가격 차트 생성"""    
-    # 가격 범위 계산
-    min_price = market_df['low_price'].min()
-    max_price = market_df['high_price'].max()
+# 차트의 고정 스타일 (렌더링마다 바뀌는 값은 함수 안에서 채움)
+CANDLESTICK_STYLE = dict(
+    increasing_line_width=4,
+    decreasing_line_width=4,
+    increasing_fillcolor='#3D9970',
+    decreasing_fillcolor='#FF4136'
+)
+# 하나의 x축을 공유하고, 가격(위 70%)/거래량(아래 30%)은 y축 영역으로 나눔
+CHART_PRICE_AXIS = dict(title='Price (KRW)', tickformat=',', domain=[0.32, 1])
+CHART_VOLUME_AXIS = dict(title='Volume', domain=[0, 0.29], anchor='x')
+CHART_LAYOUT = dict(
+    xaxis=dict(rangeslider=dict(visible=False), anchor='y2'),
+    height=800,
+    plot_bgcolor='#1e1e1e',
+    paper_bgcolor='#1e1e1e',
+    font=dict(color='white'),
+    bargap=0.3
+)
+
+# 매매 시그널 색상 (목록에 없는 거래 타입은 범례 없이 회색으로 표시)
+TRADE_SIGNAL_COLORS = {
+    'BUY': "rgba(255, 0, 0, 0.9)",          # 선명한 빨간색
+    'HOLD': "rgba(255, 255, 0, 0.9)",       # 선명한 노란색
+    'SELL': "rgba(0, 255, 255, 0.9)",       # 선명한 시안색
+    'BUY_FAIL': "rgba(255, 0, 255, 0.9)",   # 선명한 마젠타(형광 보라)
+    'SELL_FAIL': "rgba(0, 255, 0, 0.9)",    # 형광초록색
+    'OTHER': "rgba(128, 128, 128, 0.7)"     # 회색
+}
+
+def _df_fingerprint(df):
+    """데이터 변경 여부 확인용 키 - DataFrame 전체 대신 크기와 양 끝 행만 사용"""
+    if df.empty:
+        return df.shape
+    return df.shape, tuple(df.iloc[0]), tuple(df.iloc[-1])
+
+def _chart_axis_ranges(market_df):
+    """가격 축(고가/저가에 10% 여유)과 거래량 축 범위
+
+    캔들 수가 적어 pandas 집계 호출 비용이 더 크므로 NumPy 배열에서 직접 계산합니다.
+    """
+    min_price = float(market_df['low_price'].to_numpy().min())
+    max_price = float(market_df['high_price'].to_numpy().max())
+    max_volume = float(market_df['acc_trade_volume'].to_numpy().max())
     price_margin = (max_price - min_price) * 0.1
+    return [min_price - price_margin, max_price + price_margin], [0, max_volume * 1.1]
 
-    # 서브플롯 생성 (캔들스틱 + 거래량)
-    fig = make_subplots(rows=2, cols=1, 
-                       shared_xaxes=True,
-                       vertical_spacing=0.03,
-                       row_heights=[0.7, 0.3])
+def _trade_signal_lines(market_df, trade_df, price_range):
+    """차트 기간 안의 거래 시점을 매매 타입별 수직선 좌표로 변환
+    
+    선마다 도형을 추가하지 않고, 타입별 트레이스 하나에 [t, t, None] 형태로 이어 붙여 그립니다.
+    """
+    signal_lines = {trade_type: ([], []) for trade_type in TRADE_SIGNAL_COLORS}
+    if trade_df.empty:
+        return signal_lines
+
+    # 캔들(candle_date_time_kst)과 거래 내역 모두 조회 시점에 timezone 없는 KST로 맞춰져 있어 그대로 비교
+    # 캔들은 시간순이므로 처음/마지막 값이 차트 기간의 시작/끝
+    market_times = market_df['timestamp'].to_numpy()
+    trade_times = trade_df['timestamp'].to_numpy()
+    in_range = (trade_times >= market_times[0]) & (trade_times <= market_times[-1])
+
+    trades = trade_df.loc[in_range, ['timestamp', 'trade_type']]
+
+    # 행마다 dict 조회하지 않고 매매 타입을 열 단위로 분류 (정의되지 않은 타입은 OTHER)
+    signal_types = trades['trade_type'].where(trades['trade_type'].isin(TRADE_SIGNAL_COLORS), 'OTHER')
+    for trade_type, times in trades['timestamp'].groupby(signal_types, sort=False):
+        stamps = times.tolist()
+        xs = [None] * (3 * len(stamps))
+        xs[0::3] = stamps
+        xs[1::3] = stamps
+        signal_lines[trade_type] = (xs, [price_range[0], price_range[1], None] * len(stamps))
+    return signal_lines
+
+def _chart_title(market_df):
+    """현재가를 표시하는 차트 제목"""
+    current_price = market_df['closing_price'].iloc[-1]
+    return f'현재 {symbol}코인 가격 : ₩{current_price:,.0f}'
+
+def create_trading_chart(market_df, trade_df):
+    """거래 내역이 포함된 BTC 가격 차트 생성"""
+    price_range, volume_range = _chart_axis_ranges(market_df)
+
+    # 캔들스틱 + 거래량 (서브플롯 대신 y축 영역을 나눈 단일 Figure)
+    fig = go.Figure()
 
     # 캔들스틱 차트
     fig.add_trace(
@@ -248,71 +344,26 @@ def create_trading_chart(market_df, trade_df):
             low=market_df['low_price'],
             close=market_df['closing_price'],
             name='OHLC',
-            increasing_line_width=4,
-            decreasing_line_width=4,
-            increasing_fillcolor='#3D9970',
-            decreasing_fillcolor='#FF4136'
-        ),
-        row=1, col=1
+            **CANDLESTICK_STYLE
+        )
     )
 
-    # 거래 내역 표시
+    # 매수/매도/홀드 시그널 (타입별 WebGL 트레이스 하나씩)
     if not trade_df.empty:
-        # 차트에 표시된 기간에 맞추기
-        min_time = market_df['timestamp'].min()
-        max_time = market_df['timestamp'].max()
-        
-        # timestamp 비교를 위해 timezone 정보 제거
-        trade_df['timestamp'] = trade_df['timestamp'].dt.tz_localize(None)
-        market_df['timestamp'] = market_df['timestamp'].dt.tz_localize(None)
-        
-        # 거래 데이터 필터링
-        filtered_trade_df = trade_df[
-            (trade_df['timestamp'] >= min_time) & 
-            (trade_df['timestamp'] <= max_time)
-        ]
-
-        # 색상 매핑 설정
-        color_map = {
-            'BUY': "rgba(255, 0, 0, 0.9)",          # 선명한 빨간색
-            'HOLD': "rgba(255, 255, 0, 0.9)",       # 선명한 노란색
-            'SELL': "rgba(0, 255, 255, 0.9)",       # 선명한 시안색
-            'BUY_FAIL': "rgba(255, 0, 255, 0.9)",   # 선명한 마젠타(형광 보라)
-            'SELL_FAIL': "rgba(0, 255, 0, 0.9)"     # 형광초록색
-        }
-
-        # 매수/매도/홀드 시그널 추가
-        for idx, row in filtered_trade_df.iterrows():
-            line_color = color_map.get(row['trade_type'], "rgba(128, 128, 128, 0.7)")  # 기본값은 회색
-            
-            # 가격 차트에 수직선 추가
-            fig.add_shape(
-                type="line",
-                x0=row['timestamp'],
-                x1=row['timestamp'],
-                y0=min_price - price_margin,
-                y1=max_price + price_margin,
-                line=dict(
-                    color=line_color,
-                    width=3,
-                    dash="dash",
-                ),
-                row=1, col=1
-            )
-
-        # 범례 추가
-        for trade_type, color in color_map.items():
-            fig.add_trace(
-                go.Scatter(
-                    x=[None],
-                    y=[None],
-                    mode='lines',
-                    name=f'{trade_type} Signal',
-                    line=dict(color=color, width=2, dash="dash"),
-                    showlegend=True
-                ),
-                row=1, col=1
+        signal_lines = _trade_signal_lines(market_df, trade_df, price_range)
+        signal_traces = [
+            go.Scattergl(
+                x=signal_lines[trade_type][0],
+                y=signal_lines[trade_type][1],
+                mode='lines',
+                name=f'{trade_type} Signal',
+                line=dict(color=color, width=3, dash="dash"),
+                showlegend=trade_type != 'OTHER'
             )
+            for trade_type, color in TRADE_SIGNAL_COLORS.items()
+        ]
+        # 트레이스를 하나씩 추가하지 않고 한 번에 추가
+        fig.add_traces(signal_traces)
 
     # 거래량 차트
     fig.add_trace(
@@ -320,30 +371,18 @@ def create_trading_chart(market_df, trade_df):
             x=market_df['timestamp'],
             y=market_df['acc_trade_volume'],
             name='Volume',
-            marker_color='#7FDBFF'
-        ),
-        row=2, col=1
+            marker_color='#7FDBFF',
+            marker_line_width=0,  # 막대 테두리 없이 그려서 SVG 요소 수를 줄임
+            yaxis='y2'
+        )
     )
 
     # 차트 스타일 설정
-    current_price = market_df['closing_price'].iloc[-1]
     fig.update_layout(
-        title=f'현재 {symbol}코인 가격 : ₩{current_price:,.0f}',
-        yaxis=dict(
-            title='Price (KRW)',
-            range=[min_price - price_margin, max_price + price_margin],
-            tickformat=','
-        ),
-        yaxis2=dict(
-            title='Volume',
-            range=[0, market_df['acc_trade_volume'].max() * 1.1]
-        ),
-        xaxis_rangeslider_visible=False,
-        height=800,
-        plot_bgcolor='#1e1e1e',
-        paper_bgcolor='#1e1e1e',
-        font=dict(color='white'),
-        bargap=0.3
+        title=_chart_title(market_df),
+        yaxis=dict(**CHART_PRICE_AXIS, range=price_range),
+        yaxis2=dict(**CHART_VOLUME_AXIS, range=volume_range),
+        **CHART_LAYOUT
     )
 
     fig.update_xaxes(gridcolor='#333333', showgrid=True)
@@ -351,6 +390,44 @@ def create_trading_chart(market_df, trade_df):
 
     return fig
 
+def update_trading_chart(fig, market_df, trade_df):
+    """이미 만든 차트의 데이터만 교체 (트레이스와 레이아웃 객체는 재사용)"""
+    price_range, volume_range = _chart_axis_ranges(market_df)
+    candle_trace = fig.data[0]
+    signal_traces = fig.data[1:-1]
+    volume_trace = fig.data[-1]
+    signal_lines = _trade_signal_lines(market_df, trade_df, price_range)
+
+    with fig.batch_update():
+        candle_trace.x = market_df['timestamp']
+        candle_trace.open = market_df['opening_price']
+        candle_trace.high = market_df['high_price']
+        candle_trace.low = market_df['low_price']
+        candle_trace.close = market_df['closing_price']
+        volume_trace.x = market_df['timestamp']
+        volume_trace.y = market_df['acc_trade_volume']
+        fig.layout.title.text = _chart_title(market_df)
+        for signal_trace, (xs, ys) in zip(signal_traces, signal_lines.values()):
+            signal_trace.x = xs
+            signal_trace.y = ys
+        fig.layout.yaxis.range = price_range
+        fig.layout.yaxis2.range = volume_range
+
+def get_session_trading_chart(market_df, trade_df):
+    """세션마다 차트를 한 번만 만들고, 이후에는 데이터가 바뀐 경우에만 갱신"""
+    data_key = (_df_fingerprint(market_df), _df_fingerprint(trade_df))
+    fig = st.session_state.get('trading_chart')
+
+    # 범례 트레이스 구성이 달라지는 경우(거래 내역 유무 변경)에는 새로 생성
+    if fig is None or (len(fig.data) > 2) != (not trade_df.empty):
+        fig = create_trading_chart(market_df, trade_df)
+    elif st.session_state.get('trading_chart_key') != data_key:
+        update_trading_chart(fig, market_df, trade_df)
+
+    st.session_state.trading_chart = fig
+    st.session_state.trading_chart_key = data_key
+    return fig
+
 def display_trade_history(trade_df):
     """거래 내역을 표시하는 함수"""
     st.header("Trading History")
@@ -359,30 +436,31 @@ def display_trade_history(trade_df):
         st.info("No trading history in the selected time period.")
         return
     
-    # 거래 내역 데이터프레임 포맷팅
-    display_df = trade_df.copy()
-    display_df['timestamp'] = pd.to_datetime(display_df['timestamp'])
-    # UTC to KST 변환 제거
-    display_df['timestamp'] = display_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    display_df['price'] = display_df['price'].apply(lambda x: f"₩{x:,.0f}")
-    display_df['total_amount'] = display_df['total_amount'].apply(lambda x: f"₩{x:,.0f}")
-    display_df['trade_type'] = display_df['trade_type'].str.upper()
+    # 거래 내역 데이터프레임 포맷팅 (원본을 복사한 뒤 열마다 덮어쓰지 않고 새 열로 한 번에 구성)
+    # timestamp는 datetime 그대로 두고 표시 형식은 column_config에서 지정 (행마다 strftime 하지 않음)
+    # 금액은 천 단위 구분 기호가 필요해 문자열로 변환
+    display_df = trade_df.assign(
+        price='₩' + trade_df['price'].map('{:,.0f}'.format),
+        total_amount='₩' + trade_df['total_amount'].map('{:,.0f}'.format),
+        trade_type=trade_df['trade_type'].str.upper()
+    )
     
     st.dataframe(
         display_df,
         column_config={
-            "timestamp": "시간",
+            "timestamp": st.column_config.DatetimeColumn("시간", format="YYYY-MM-DD HH:mm:ss"),
             "trade_type": "매매타입",
             "quantity": "개수",
             "price": "가격",
             "total_amount": "총 구매 가격",
             "order_id": "Order ID"
         },
-        hide_index=True
+        hide_index=True,
+        use_container_width=True
     )
 
-def get_trade_executions(db, hours=24):
-    """거래 실행 내역을 가져오는 함수"""
+def query_trade_executions(db, hours=24):
+    """거래 실행 내역을 DB에서 직접 조회 (캐시 없음 - 백그라운드 스레드에서도 호출 가능)"""
     with db.get_connection() as conn:
         query = """
         SELECT 
@@ -392,16 +470,45 @@ def get_trade_executions(db, hours=24):
             price,
             total_amount
         FROM trade_executions
-        WHERE timestamp >= datetime('now', ?)
+        WHERE timestamp >= ?
         ORDER BY timestamp DESC
         """
-        df = pd.read_sql_query(query, conn, params=(f'-{hours} hours',))
-        if not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            # UTC to KST 변환 제거
-        return df
-
-def display_analysis_results(latest_analysis, all_analysis):
+        return pd.read_sql_query(
+            query, conn, params=(since_hours(hours),),
+            parse_dates={'timestamp': {'format': 'ISO8601'}},
+            dtype={'quantity': 'float64', 'price': 'float64', 'total_amount': 'float64'}
+        )
+
+def query_trade_signals(db, hours=24):
+    """차트 표시용 거래 시점만 조회 (시간, 매매 타입 두 열만 읽음)"""
+    with db.get_connection() as conn:
+        query = """
+        SELECT timestamp, trade_type
+        FROM trade_executions
+        WHERE timestamp >= ?
+        ORDER BY timestamp DESC
+        """
+        return pd.read_sql_query(
+            query, conn, params=(since_hours(hours),),
+            parse_dates={'timestamp': {'format': 'ISO8601'}}
+        )
+
+@st.cache_data(ttl=DB_CACHE_TTL, show_spinner=False)
+def get_trade_executions(_db, hours=24):
+    """거래 실행 내역을 가져오는 함수 (같은 TTL 안의 재실행/다른 탭에서는 캐시 사용)"""
+    return query_trade_executions(_db, hours)
+
+@st.cache_data(ttl=DB_CACHE_TTL, show_spinner=False)
+def get_analysis_results(_db, hours=24):
+    """최신 전체 분석과 분석 기록(본문 제외)을 가져오는 함수 (캐시)"""
+    return _db.get_latest_full_analysis(), _db.get_all_analysis_results(hours=hours, include_text=False)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_analysis_text(_db, analysis_type, timestamp):
+    """분석 본문 하나를 가져오는 함수 (저장된 본문은 바뀌지 않으므로 TTL 없이 캐시)"""
+    return _db.get_analysis_text(analysis_type, timestamp)
+
+def display_analysis_results(db, latest_analysis, all_analysis):
     """분석 결과를 표시하는 함수"""
     st.header("최근 분석 결과")
     
@@ -409,16 +516,17 @@ def display_analysis_results(latest_analysis, all_analysis):
     analysis_tabs = st.tabs(["Final Decision", "Price Analysis", "News Analysis"])
     
     if not all_analysis.empty:
-        # 각 분석 유형별 최신 데이터 가져오기
-        final_analysis = all_analysis[all_analysis['analysis_type'] == 'final'].iloc[0] if len(all_analysis[all_analysis['analysis_type'] == 'final']) > 0 else None
-        price_analysis = all_analysis[all_analysis['analysis_type'] == 'price'].iloc[0] if len(all_analysis[all_analysis['analysis_type'] == 'price']) > 0 else None
-        news_analysis = all_analysis[all_analysis['analysis_type'] == 'news'].iloc[0] if len(all_analysis[all_analysis['analysis_type'] == 'news']) > 0 else None
+        # 각 분석 유형별 최신 데이터 가져오기 (쿼리 결과가 최신순이므로 유형별 첫 행이 최신)
+        latest_by_type = all_analysis.drop_duplicates(subset='analysis_type').set_index('analysis_type')
+        final_analysis = latest_by_type.loc['final'] if 'final' in latest_by_type.index else None
+        price_analysis = latest_by_type.loc['price'] if 'price' in latest_by_type.index else None
+        news_analysis = latest_by_type.loc['news'] if 'news' in latest_by_type.index else None
         
         # Final Decision 탭
         with analysis_tabs[0]:
             if final_analysis is not None:
                 st.markdown(f"**Timestamp:** {final_analysis['timestamp']}")
-                st.text_area("Analysis", final_analysis['analysis_text'], height=300, key="final_decision")
+                st.text_area("Analysis", get_analysis_text(db, 'final', final_analysis['timestamp']), height=300, key="final_decision")
             else:
                 st.info("No final decision analysis available.")
         
@@ -426,7 +534,7 @@ def display_analysis_results(latest_analysis, all_analysis):
         with analysis_tabs[1]:
             if price_analysis is not None:
                 st.markdown(f"**Timestamp:** {price_analysis['timestamp']}")
-                st.text_area("Analysis", price_analysis['analysis_text'], height=300, key="price_analysis")
+                st.text_area("Analysis", get_analysis_text(db, 'price', price_analysis['timestamp']), height=300, key="price_analysis")
             else:
                 st.info("No price analysis available.")
         
@@ -434,21 +542,74 @@ def display_analysis_results(latest_analysis, all_analysis):
         with analysis_tabs[2]:
             if news_analysis is not None:
                 st.markdown(f"**Timestamp:** {news_analysis['timestamp']}")
-                st.text_area("Analysis", news_analysis['analysis_text'], height=300, key="news_analysis")
+                st.text_area("Analysis", get_analysis_text(db, 'news', news_analysis['timestamp']), height=300, key="news_analysis")
             else:
                 st.info("No news analysis available.")
     
-    # Analysis History 표시 (최근 5개만)
-    st.header("Analysis History (최근 5개)")
+    # Analysis History 표시 (최근 15개만)
+    st.header("Analysis History (최근 15개)")
+    
+    # 기본으로는 히스토리를 만들지 않아 자동 새로고침마다 표와 위젯을 다시 그리지 않음
+    if not st.toggle("히스토리 보기", key="show_analysis_history"):
+        return
+    
+    # 최근 항목만 선택 (get_all_analysis_results가 이미 timestamp 내림차순으로 반환)
+    recent_analysis = all_analysis.head(ANALYSIS_HISTORY_SIZE)
+    
+    if recent_analysis.empty:
+        st.info("No analysis history available.")
+        return
     
-    # timestamp를 기준으로 정렬하고 최근 5개만 선택
-    recent_analysis = all_analysis.sort_values('timestamp', ascending=False).head(15)
+    # 목록은 하나의 표로, 본문은 선택한 항목만 표시
+    # 현재가는 천 단위 구분 기호가 필요해 문자열로 변환 (뉴스 분석처럼 가격이 없는 행은 빈칸)
+    prices = recent_analysis['current_price'].dropna()
+    history_df = recent_analysis[['timestamp', 'analysis_type']].assign(
+        current_price=('₩' + prices.map('{:,.0f}'.format)).reindex(recent_analysis.index, fill_value='')
+    )
+    st.dataframe(
+        history_df,
+        column_config={
+            "timestamp": "시간",
+            "analysis_type": "분석 유형",
+            "current_price": "현재가"
+        },
+        hide_index=True,
+        use_container_width=True
+    )
     
-    for _, row in recent_analysis.iterrows():
-        with st.expander(f"{row['analysis_type']} Analysis - {row['timestamp']}"):
-            if pd.notnull(row['current_price']):
-                st.markdown(f"**Current Price:** ₩{row['current_price']:,}")
-            st.text_area("Analysis", row['analysis_text'], height=200, key=f"{row['timestamp']}_{row['analysis_type']}")
+    selected_idx = st.selectbox(
+        "분석 내용 보기",
+        recent_analysis.index,
+        format_func=lambda idx: f"{recent_analysis.at[idx, 'analysis_type']} Analysis - {recent_analysis.at[idx, 'timestamp']}"
+    )
+    selected_text = get_analysis_text(
+        db, recent_analysis.at[selected_idx, 'analysis_type'], recent_analysis.at[selected_idx, 'timestamp']
+    )
+    st.text_area("Analysis", selected_text, height=300, key="analysis_history")
+
+def display_chart_tab(db):
+    """차트 탭 - 캔들과 거래 시점 표시"""
+    # DB 조회는 백그라운드에서 실행하고 그동안 업비트 캔들 데이터를 받아옴
+    trade_future = get_io_executor().submit(query_trade_signals, db, hours=24)
+    market_df = get_upbit_candle_data(st.session_state.candle_interval, st.session_state.candle_count)
+    trade_df = trade_future.result()
+
+    if not market_df.empty:
+        fig = get_session_trading_chart(market_df, trade_df)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.error("Failed to load market data from Upbit API.")
+
+    st.caption(f"최근 업데이트 시간: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+def display_trade_history_tab(db):
+    """매매 히스토리 탭"""
+    display_trade_history(get_trade_executions(db, hours=24))
+
+def display_analysis_tab(db):
+    """분석 결과 탭"""
+    latest_analysis, all_analysis = get_analysis_results(db, hours=24)
+    display_analysis_results(db, latest_analysis, all_analysis)
 
 def main():
     st.set_page_config(page_title='Upbit Trading Monitor', 
@@ -466,8 +627,7 @@ def main():
     
     st.title(f'{symbol} 자동매매 모니터링')
 
-    db = DatabaseManager()
-    display_metrics()
+    db = get_db()
 
     st.sidebar.header('설정')
     
@@ -480,10 +640,11 @@ def main():
     )
 
     # 캔들 간격 설정 (업비트에서 지원하는 간격으로 수정)
+    candle_intervals = list(CANDLE_INTERVAL_MAP)
     st.session_state.candle_interval = st.sidebar.selectbox(
         '캔들 간격',
-        ['1m', '3m', '5m', '10m', '30m', '1h', '6h', '12h', '24h'],
-        index=['1m', '3m', '5m', '10m', '30m', '1h', '6h', '12h', '24h'].index(st.session_state.candle_interval)
+        candle_intervals,
+        index=candle_intervals.index(st.session_state.candle_interval)
     )
 
     st.session_state.candle_count = st.sidebar.slider(
@@ -493,45 +654,33 @@ def main():
         value=st.session_state.candle_count
     )
 
+    # 자동 새로고침 - 페이지 전체 대신 각 영역(fragment)만 주기적으로 다시 실행
+    run_every = st.session_state.refresh_interval
+    st.fragment(display_metrics, run_every=run_every)()
+
     # 탭 생성
     tabs = st.tabs(["비트코인 차트", "매매 히스토리", "분석 결과"])
 
     with tabs[0]:
-        market_df = get_upbit_candle_data(st.session_state.candle_interval, st.session_state.candle_count)
-        trade_df = get_trade_executions(db, hours=24)
-
-        if not market_df.empty:
-            chart_container = st.empty()
-            fig = create_trading_chart(market_df, trade_df)
-            chart_container.plotly_chart(fig, use_container_width=True)
-        else:
-            st.error("Failed to load market data from Upbit API.")
+        st.fragment(display_chart_tab, run_every=run_every)(db)
 
     with tabs[1]:
-        display_trade_history(trade_df)
+        st.fragment(display_trade_history_tab, run_every=run_every)(db)
 
     with tabs[2]:
-        latest_analysis = db.get_latest_full_analysis()
-        all_analysis = db.get_all_analysis_results(hours=24)
-        display_analysis_results(latest_analysis, all_analysis)
-
-    # 자동 새로고침
-    st.markdown(f"""
-        <meta http-equiv="refresh" content="{st.session_state.refresh_interval}">
-        <script>
-            setTimeout(function(){{ window.location.reload(); }}, {st.session_state.refresh_interval * 1000});
-        </script>
-    """, unsafe_allow_html=True)
-
-    # 사이드바 정보
+        st.fragment(display_analysis_tab, run_every=run_every)(db)
+
+    # 사이드바 정보 (fragment에서는 사이드바를 갱신할 수 없어 전체 실행 시에만 갱신)
     st.sidebar.markdown("---")
-    st.sidebar.write("최근 업데이트 시간:", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    trade_df = get_trade_executions(db, hours=24)
 
     if not trade_df.empty:
+        # 거래 타입별 건수를 한 번에 집계 (DB에는 대문자로 저장됨)
+        trade_counts = trade_df['trade_type'].str.upper().value_counts()
         st.sidebar.write("거래 데이터 확인:")
         st.sidebar.write(f"총 거래 건수: {len(trade_df)}")
-        st.sidebar.write(f"매수 건수: {len(trade_df[trade_df['trade_type'] == 'buy'])}")
-        st.sidebar.write(f"매도 건수: {len(trade_df[trade_df['trade_type'] == 'sell'])}")
+        st.sidebar.write(f"매수 건수: {trade_counts.get('BUY', 0)}")
+        st.sidebar.write(f"매도 건수: {trade_counts.get('SELL', 0)}")
         st.sidebar.write("시간 범위:", trade_df['timestamp'].min(), "~", trade_df['timestamp'].max())
 
 if __name__ == "__main__":
@@ -1,22 +1,107 @@
+import re
 import sqlite3
+import threading
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterable, Optional
 import pandas as pd
 
+# 분석 유형별 결과 테이블
+ANALYSIS_TABLES = {
+    'news': 'news_analysis',
+    'price': 'price_analysis',
+    'final': 'final_decision'
+}
+
+# INSERT 문은 모듈 상수로 두고 같은 문자열을 재사용 (sqlite3 연결의 statement 캐시가 컴파일 결과를 재사용)
+INSERT_NEWS_SQL = "INSERT INTO news (title, description, pub_date) VALUES (?, ?, ?)"
+INSERT_MARKET_DATA_SQL = """
+    INSERT INTO market_data (
+        timestamp, current_price, opening_price,
+        high_price, low_price, signed_change_rate
+    )
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_NEWS_ANALYSIS_SQL = "INSERT INTO news_analysis (timestamp, analysis_text) VALUES (?, ?)"
+INSERT_PRICE_ANALYSIS_SQL = "INSERT INTO price_analysis (timestamp, current_price, analysis_text) VALUES (?, ?, ?)"
+INSERT_FINAL_DECISION_SQL = "INSERT INTO final_decision (timestamp, current_price, analysis_text) VALUES (?, ?, ?)"
+INSERT_TRADE_EXECUTION_SQL = """
+    INSERT INTO trade_executions
+    (timestamp, trade_type, quantity, price, total_amount, order_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+def since_hours(hours: int) -> str:
+    """최근 hours시간 조회의 시작 시각
+
+    timestamp는 datetime.now()(로컬 시간)로 저장되므로 UTC 기준인 SQLite datetime('now')가 아니라
+    같은 로컬 시간 문자열로 한 번 계산해서 바인딩합니다.
+    """
+    return (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+# 최종 결정 텍스트의 투자 비중 (예: "투자 비중: 50%")
+INVESTMENT_RATIO_PATTERN = re.compile(r'투자\s*비중[:\s]*(\d+)')
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "crypto_analysis.db"):
-        """데이터베이스 매니저 초기화"""
+    # 이 프로세스에서 테이블/인덱스 생성을 마친 DB 경로 (인스턴스마다 DDL을 반복하지 않음)
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+
+    def __init__(self, db_path: str = "crypto_analysis.db", shared_connection: bool = False):
+        """데이터베이스 매니저 초기화
+
+        shared_connection: True이면 모든 스레드가 연결 하나를 잠금으로 나눠 씀
+        (Streamlit처럼 재실행마다 새 스레드에서 호출되어 스레드별 연결이 재사용되지 않는 경우)
+        """
         self.db_path = db_path
-        self._create_tables()
+        self.shared_connection = shared_connection
+        # 호출마다 새로 연결하지 않고 스레드별로 연결 하나를 유지해서 재사용
+        self._local = threading.local()
+        self._shared_conn = None
+        self._shared_lock = threading.RLock()
+        with DatabaseManager._init_lock:
+            if db_path not in DatabaseManager._initialized_paths:
+                self._create_tables()
+                DatabaseManager._initialized_paths.add(db_path)
+
+    def _open_connection(self, check_same_thread: bool = True):
+        """새 연결을 열고 PRAGMA 설정을 적용합니다."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
+        # WAL: 봇의 쓰기 중에도 대시보드 읽기가 막히지 않도록 함
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-65536")
+        # 정렬/임시 테이블은 메모리에서, 읽기는 mmap(256MB)으로 처리
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
 
+    @contextmanager
     def get_connection(self):
-        """데이터베이스 연결을 반환합니다."""
-        return sqlite3.connect(self.db_path)
+        """데이터베이스 연결을 `with` 블록으로 제공합니다.
+
+        기본은 스레드마다 한 번만 연결을 열고 이후에는 같은 연결을 재사용합니다.
+        shared_connection이면 프로세스에서 연결 하나를 열고 블록이 끝날 때까지 잠금을 잡습니다.
+        블록이 끝나면 기존과 같이 커밋/롤백만 처리하고 연결은 닫지 않습니다.
+        """
+        if self.shared_connection:
+            with self._shared_lock:
+                if self._shared_conn is None:
+                    self._shared_conn = self._open_connection(check_same_thread=False)
+                with self._shared_conn:
+                    yield self._shared_conn
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+        with conn:
+            yield conn
     
     def _create_tables(self):
         """필요한 테이블들을 생성합니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             
             # 뉴스 데이터 테이블
@@ -89,78 +174,104 @@ class DatabaseManager:
                 )
             """)
             
+            # 시간 범위 조회(최근 N시간, 최신 1건)가 전체 테이블 스캔이 되지 않도록 인덱스 생성
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_pub_date ON news(pub_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_market_data_ts ON market_data(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_analysis_ts ON news_analysis(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_analysis_ts ON price_analysis(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_final_decision_ts ON final_decision(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trade_executions_ts ON trade_executions(timestamp)")
+            
             conn.commit()
+            
+            # 플래너 통계(sqlite_stat1)가 아직 없으면 인덱스를 만든 직후 한 번 ANALYZE
+            # (PRAGMA optimize는 3.46 미만에서 이 연결로 조회한 테이블만 분석하므로 새 연결에서는 아무것도 하지 않음)
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone()
+            if not has_stats:
+                conn.execute("ANALYZE")
+                conn.commit()
     
     def save_news(self, title: str, description: str, pub_date: datetime):
         """뉴스 데이터를 저장합니다."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO news (title, description, pub_date)
-                VALUES (?, ?, ?)
-            """, (title, description, pub_date))
+        self.save_news_many([(title, description, pub_date)])
+
+    def save_news_many(self, rows: Iterable[tuple]):
+        """뉴스 여러 건을 하나의 트랜잭션으로 저장합니다.
+
+        rows: (title, description, pub_date) 튜플 목록
+        """
+        with self.get_connection() as conn:
+            conn.executemany(INSERT_NEWS_SQL, rows)
             conn.commit()
     
     def save_market_data(self, timestamp: datetime, current_price: float, 
                         opening_price: float, high_price: float, 
                         low_price: float, signed_change_rate: float):
         """시장 데이터를 저장합니다."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO market_data (
-                    timestamp, current_price, opening_price, 
-                    high_price, low_price, signed_change_rate
-                )
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (timestamp, current_price, opening_price, 
-                 high_price, low_price, signed_change_rate))
+        self.save_market_data_many([(timestamp, current_price, opening_price,
+                                     high_price, low_price, signed_change_rate)])
+
+    def save_market_data_many(self, rows: Iterable[tuple]):
+        """시장 데이터 여러 건을 하나의 트랜잭션으로 저장합니다.
+
+        rows: (timestamp, current_price, opening_price, high_price, low_price, signed_change_rate) 튜플 목록
+        """
+        with self.get_connection() as conn:
+            conn.executemany(INSERT_MARKET_DATA_SQL, rows)
             conn.commit()
     
     def save_news_analysis(self, timestamp: datetime, analysis_text: str):
         """뉴스 분석 결과를 저장합니다."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO news_analysis (timestamp, analysis_text)
-                VALUES (?, ?)
-            """, (timestamp, analysis_text))
+        with self.get_connection() as conn:
+            conn.execute(INSERT_NEWS_ANALYSIS_SQL, (timestamp, analysis_text))
             conn.commit()
     
     def save_price_analysis(self, timestamp: datetime, current_price: float, analysis_text: str):
         """가격 분석 결과를 저장합니다."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO price_analysis (timestamp, current_price, analysis_text)
-                VALUES (?, ?, ?)
-            """, (timestamp, current_price, analysis_text))
+        with self.get_connection() as conn:
+            conn.execute(INSERT_PRICE_ANALYSIS_SQL, (timestamp, current_price, analysis_text))
             conn.commit()
     
     def save_final_decision(self, timestamp: datetime, current_price: float, analysis_text: str):
         """최종 투자 결정을 저장합니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
+            conn.execute(INSERT_FINAL_DECISION_SQL, (timestamp, current_price, analysis_text))
+            conn.commit()
+    
+    def save_analysis_cycle(self, news_analysis: Optional[tuple] = None,
+                            price_analysis: Optional[tuple] = None,
+                            final_decision: Optional[tuple] = None):
+        """한 분석 주기의 결과를 하나의 트랜잭션으로 저장합니다.
+
+        news_analysis: (timestamp, analysis_text)
+        price_analysis, final_decision: (timestamp, current_price, analysis_text)
+        """
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO final_decision (timestamp, current_price, analysis_text)
-                VALUES (?, ?, ?)
-            """, (timestamp, current_price, analysis_text))
+            if news_analysis:
+                cursor.execute(INSERT_NEWS_ANALYSIS_SQL, news_analysis)
+            if price_analysis:
+                cursor.execute(INSERT_PRICE_ANALYSIS_SQL, price_analysis)
+            if final_decision:
+                cursor.execute(INSERT_FINAL_DECISION_SQL, final_decision)
             conn.commit()
     
     def get_recent_news(self, hours: int = 24) -> pd.DataFrame:
         """최근 뉴스를 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             query = """
                 SELECT title, description, pub_date
                 FROM news
-                WHERE pub_date >= datetime('now', ?)
+                WHERE pub_date >= ?
                 ORDER BY pub_date DESC
             """
-            return pd.read_sql_query(query, conn, params=(f'-{hours} hours',))
+            return pd.read_sql_query(query, conn, params=(since_hours(hours),))
         
     def get_recent_news_limit(self, limit: int = 25) -> pd.DataFrame:
         """최근 뉴스를 limit 개수만큼 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             query = """
                 SELECT title, description, pub_date
                 FROM news
@@ -168,69 +279,97 @@ class DatabaseManager:
                 LIMIT ?
             """
             return pd.read_sql_query(query, conn, params=(limit,))
+
+    def get_recent_news_records(self, limit: int = 25) -> list:
+        """최근 뉴스를 limit 개수만큼 dict 목록으로 가져옵니다 (DataFrame이 필요 없는 호출용)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute("""
+                SELECT title, description, pub_date
+                FROM news
+                ORDER BY pub_date DESC
+                LIMIT ?
+            """, (limit,))
+            return [dict(row) for row in cursor.fetchall()]
     
     def get_market_data(self, hours: int = 24) -> pd.DataFrame:
         """최근 시장 데이터를 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             query = """
                 SELECT timestamp, current_price, opening_price, 
                        high_price, low_price, signed_change_rate
                 FROM market_data
-                WHERE timestamp >= datetime('now', ?)
+                WHERE timestamp >= ?
                 ORDER BY timestamp DESC
             """
-            return pd.read_sql_query(query, conn, params=(f'-{hours} hours',))
+            # 조회 시점에 한 번만 타입을 확정해서 화면 갱신마다 변환하지 않도록 함
+            return pd.read_sql_query(
+                query, conn, params=(since_hours(hours),),
+                parse_dates={'timestamp': {'format': 'ISO8601'}},
+                dtype={
+                    'current_price': 'float64',
+                    'opening_price': 'float64',
+                    'high_price': 'float64',
+                    'low_price': 'float64',
+                    'signed_change_rate': 'float64'
+                }
+            )
     
     def get_latest_analyses(self) -> dict:
         """가장 최근의 모든 분석 결과를 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 각 분석 유형별로 가장 최근 결과를 가져옴
-            news_analysis = cursor.execute("""
-                SELECT timestamp, current_price, analysis_text
-                FROM news_analysis
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """).fetchone()
-            
-            price_analysis = cursor.execute("""
-                SELECT timestamp, current_price, analysis_text
-                FROM price_analysis
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """).fetchone()
-            
-            final_decision = cursor.execute("""
-                SELECT timestamp, current_price, analysis_text
-                FROM final_decision
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """).fetchone()
+        with self.get_connection() as conn:
+            # 각 분석 유형별 최신 결과를 한 번의 쿼리로 가져옴 (news_analysis에는 current_price 열이 없음)
+            rows = conn.execute("""
+                SELECT * FROM (
+                    SELECT 'news_analysis', timestamp, NULL, analysis_text
+                    FROM news_analysis ORDER BY timestamp DESC LIMIT 1
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'price_analysis', timestamp, current_price, analysis_text
+                    FROM price_analysis ORDER BY timestamp DESC LIMIT 1
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'final_decision', timestamp, current_price, analysis_text
+                    FROM final_decision ORDER BY timestamp DESC LIMIT 1
+                )
+            """).fetchall()
             
-            return {
-                'news_analysis': {
-                    'timestamp': news_analysis[0] if news_analysis else None,
-                    'current_price': news_analysis[1] if news_analysis else None,
-                    'analysis': news_analysis[2] if news_analysis else None
-                },
-                'price_analysis': {
-                    'timestamp': price_analysis[0] if price_analysis else None,
-                    'current_price': price_analysis[1] if price_analysis else None,
-                    'analysis': price_analysis[2] if price_analysis else None
-                },
-                'final_decision': {
-                    'timestamp': final_decision[0] if final_decision else None,
-                    'current_price': final_decision[1] if final_decision else None,
-                    'analysis': final_decision[2] if final_decision else None
-                }
+            latest = {
+                key: {'timestamp': None, 'current_price': None, 'analysis': None}
+                for key in ('news_analysis', 'price_analysis', 'final_decision')
             }
+            for key, timestamp, current_price, analysis_text in rows:
+                latest[key] = {
+                    'timestamp': timestamp,
+                    'current_price': current_price,
+                    'analysis': analysis_text
+                }
+            return latest
+
     def get_latest_full_analysis(self):
         """가장 최근의 전체 분석 결과를 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             
+            # date()로 조인하면 인덱스를 쓰지 못하고 테이블끼리 중첩 스캔하므로,
+            # 테이블별 최신 1건을 timestamp 인덱스로 가져와서 결합
             query = """
+            WITH n AS (
+                SELECT timestamp, analysis_text FROM news_analysis
+                WHERE timestamp >= :since
+                ORDER BY timestamp DESC LIMIT 1
+            ),
+            p AS (
+                SELECT timestamp, analysis_text, current_price FROM price_analysis
+                ORDER BY timestamp DESC LIMIT 1
+            ),
+            f AS (
+                SELECT timestamp, analysis_text FROM final_decision
+                ORDER BY timestamp DESC LIMIT 1
+            )
             SELECT 
                 n.timestamp as news_timestamp,
                 n.analysis_text as news_analysis,
@@ -239,63 +378,66 @@ class DatabaseManager:
                 p.current_price,
                 f.timestamp as final_timestamp,
                 f.analysis_text as final_decision
-            FROM news_analysis n
-            JOIN price_analysis p ON date(n.timestamp) = date(p.timestamp)
-            JOIN final_decision f ON date(p.timestamp) = date(f.timestamp)
-            WHERE n.timestamp >= datetime('now', '-24 hours')
-            ORDER BY n.timestamp DESC
-            LIMIT 1;
+            FROM n, p, f;
             """
             
-            cursor.execute(query)
-            result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'news_timestamp': result[0],
-                    'news_analysis': result[1],
-                    'price_timestamp': result[2],
-                    'price_analysis': result[3],
-                    'current_price': result[4],
-                    'final_timestamp': result[5],
-                    'final_decision': result[6]
-                }
-            return None
+            # 열 별칭이 반환 dict의 키와 같으므로 Row로 받아 그대로 dict로 변환
+            cursor.row_factory = sqlite3.Row
+            result = cursor.execute(query, {'since': since_hours(24)}).fetchone()
+            return dict(result) if result else None
 
-    def get_all_analysis_results(self, hours=24):
-        """모든 분석 결과(뉴스, 가격, 최종 결정)를 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_all_analysis_results(self, hours=24, include_text=True):
+        """모든 분석 결과(뉴스, 가격, 최종 결정)를 가져옵니다.
+
+        include_text=False이면 긴 분석 본문 없이 유형/시간/가격만 가져오고,
+        본문은 필요한 항목만 get_analysis_text로 따로 조회합니다.
+        """
+        text_column = "analysis_text," if include_text else ""
+        with self.get_connection() as conn:
             query = f"""
             SELECT 
                 'news' as analysis_type,
                 timestamp,
-                analysis_text,
+                {text_column}
                 NULL as current_price
             FROM news_analysis 
-            WHERE timestamp >= datetime('now', '-{hours} hours')
+            WHERE timestamp >= :since
             UNION ALL
             SELECT 
                 'price' as analysis_type,
                 timestamp,
-                analysis_text,
+                {text_column}
                 current_price
             FROM price_analysis
-            WHERE timestamp >= datetime('now', '-{hours} hours')
+            WHERE timestamp >= :since
             UNION ALL
             SELECT 
                 'final' as analysis_type,
                 timestamp,
-                analysis_text,
+                {text_column}
                 current_price
             FROM final_decision
-            WHERE timestamp >= datetime('now', '-{hours} hours')
+            WHERE timestamp >= :since
             ORDER BY timestamp DESC;
             """
             
-            return pd.read_sql_query(query, conn)
+            # 긴 분석 텍스트를 Arrow 문자열로 바로 받아 Streamlit 직렬화 시 변환 비용을 줄임
+            return pd.read_sql_query(query, conn, params={'since': since_hours(hours)},
+                                     dtype_backend='pyarrow')
+
+    def get_analysis_text(self, analysis_type, timestamp):
+        """분석 유형과 시간으로 분석 본문 하나를 가져옵니다."""
+        table = ANALYSIS_TABLES[analysis_type]
+        with self.get_connection() as conn:
+            row = conn.execute(
+                f"SELECT analysis_text FROM {table} WHERE timestamp = ? LIMIT 1",
+                (timestamp,)
+            ).fetchone()
+            return row[0] if row else None
+
     def get_analysis_data(self, hours=24):
         """최근 분석 결과와 투자 결정을 가져옵니다."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             query = """
             SELECT 
                 timestamp,
@@ -303,29 +445,25 @@ class DatabaseManager:
                 analysis_text as decision,
                 NULL as investment_ratio
             FROM final_decision
-            WHERE timestamp >= datetime('now', ?) 
+            WHERE timestamp >= ? 
             ORDER BY timestamp DESC
             """
-            df = pd.read_sql_query(query, conn, params=(f'-{hours} hours',))
+            df = pd.read_sql_query(
+                query, conn, params=(since_hours(hours),),
+                parse_dates={'timestamp': {'format': 'ISO8601'}},
+                dtype={'current_price': 'float64'}
+            )
             
             # 분석 텍스트에서 투자 비중 추출 (예: "투자 비중: 50%")
-            df['investment_ratio'] = df['decision'].str.extract(r'투자\s*비중[:\s]*(\d+)').astype(float)
+            df['investment_ratio'] = df['decision'].str.extract(INVESTMENT_RATIO_PATTERN, expand=False).astype(float)
             
             return df
 
     def save_trade_execution(self, timestamp, trade_type, quantity, price, total_amount, order_id):
         """거래 실행 결과를 데이터베이스에 저장"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                query = """
-                    INSERT INTO trade_executions 
-                    (timestamp, trade_type, quantity, price, total_amount, order_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """
-                
-                cursor.execute(query, (
+            with self.get_connection() as conn:
+                conn.execute(INSERT_TRADE_EXECUTION_SQL, (
                     timestamp,
                     trade_type,
                     quantity,
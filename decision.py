@@ -1,8 +1,14 @@
 from typing import TypedDict, Sequence
 from datetime import datetime, timedelta
+import contextvars
 import json
+import math
 import os
+import random
+import orjson
 from langchain_core.messages import BaseMessage
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from langchain_openai import ChatOpenAI
 from langgraph.graph import Graph, StateGraph
 from langchain_core.tools import tool
@@ -13,6 +19,7 @@ from database_manager import DatabaseManager
 from news_collector import NaverNewsCollector
 import time
 import traceback  # traceback 모듈 추가
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
 from database_manager import DatabaseManager
@@ -36,6 +43,9 @@ os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
 os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGSMITH_API_KEY")
 os.environ["LANGCHAIN_PROJECT"] = "bitcoin_agent"
 
+# 동일한 프롬프트(예: 새 뉴스가 없는 주기의 뉴스 분석)는 OpenAI를 다시 호출하지 않고 캐시된 응답을 사용
+LLM_CACHE_MAXSIZE = 256
+set_llm_cache(InMemoryCache(maxsize=LLM_CACHE_MAXSIZE))
 
 # 상태 타입 정의
 class AgentState(TypedDict):
@@ -51,14 +61,286 @@ trader = UpbitTrader()
 trade_executor = UpbitTradeExecutor()
 langsmith_client = Client()
 
+# LLM 클라이언트는 한 번만 생성해서 모든 주기에서 재사용
+analysis_llm = ChatOpenAI(
+    model="gpt-4o-mini",
+    temperature=0.3,
+    api_key=os.getenv('OPENAI_API_KEY')
+)
+decision_llm = ChatOpenAI(
+    model="gpt-4o-mini",
+    temperature=0.2,
+    api_key=os.getenv('OPENAI_API_KEY')
+)
+
+# 프롬프트에 넣는 지표 값은 유효숫자 5자리로 반올림 (의미 없는 자릿수로 토큰을 낭비하지 않도록)
+PROMPT_SIGNIFICANT_DIGITS = 5
+# 모든 시간대(1~30분) 변동률이 이 값(%) 미만이고 거래량 변화율도 VOLUME_FLAT_THRESHOLD(%) 미만이면
+# 횡보로 보고 가격 분석 LLM 호출을 생략
+LOW_VOLATILITY_THRESHOLD = 0.2
+VOLUME_FLAT_THRESHOLD = 30
+
+# 가격 분석 프롬프트 템플릿 (import 시 한 번만 만들고 매 주기 값만 채움)
+PERIOD_NAMES = {
+    '1m': '1분',
+    '3m': '3분',
+    '5m': '5분',
+    '10m': '10분',
+    '15m': '15분',
+    '30m': '30분',
+}
+
+PRICE_PROMPT_HEADER = """당신은 암호화폐 기술적 분석 전문가입니다.
+다음 데이터를 기반으로 투자 결정을 내려주세요.
+
+현재가: {current_price}원
+
+=== 각 시간대별 변동률 ===
+{change_rates}
+"""
+
+PRICE_PERIOD_TEMPLATE = """
+=== {period_name} 기준 지표 ===
+- RSI(14): {rsi}
+- Stochastic K/D: {stoch_k}/{stoch_d}
+- 볼린저 밴드:
+  상단: {bb_upper}
+  중간: {bb_middle}
+  하단: {bb_lower}
+- 이동평균선:
+  MA5: {ma5}
+  MA10: {ma10}
+  MA20: {ma20}
+  MA50: {ma50}
+- EMA:
+  EMA12: {ema12}
+  EMA26: {ema26}
+- ATR: {atr}
+- VWAP: {vwap}
+- MFI: {mfi}
+- Williams %R: {williams_r}
+- CCI: {cci}
+- 변동률: {change_rate}%
+"""
+
+PRICE_PROMPT_FOOTER = """
+[시장 분석 기준]
+1. 추세 강도 판단
+   - 이동평균선 배열
+   - 추세선 저항/지지
+   - 추세 모멘텀 지속성
+
+2. 단기 반전 신호
+   - RSI, Stochastic 다이버전스
+   - 볼린저 밴드 침투
+   - 거래량 급증 구간
+
+3. 매매 시점 정밀도
+   - 15분봉 이하 단기 차트 우선
+   - 복합 지표 확증 신호
+   - 거래량 프로필 기반 가격대 분석
+
+4. 리스크 관리
+   - 변동성 기반 손절가
+   - 예상 손익비
+   - 포지션 진입 타이밍
+
+다음 형식으로 분석 결과를 제공해주세요:
+1. 투자 판단
+   - 투자결정: (매수/매도/관망)
+   - 투자비중: (0-100%)
+   - 목표가/손절가
+   - 예상 진입 유지 시간
+
+2. 주요 시그널 분석
+   - 단기(1-5분): 주요 전환점/강도
+   - 중기(10-30분): 추세 방향/강도
+   - 거래량 특이점
+   - 주목할 기술적 패턴
+
+3. 리스크 평가
+   - 반전 가능성
+   - 변동성 수준
+   - 거래량 리스크
+   - 추천 레버리지 배수
+
+4. 종합 점수: (-5 ~ +5)
+   음수: 하락 가능성
+   양수: 상승 가능성
+   절대값: 신뢰도
+"""
+
+def format_significant(value, digits=PROMPT_SIGNIFICANT_DIGITS):
+    """숫자를 유효숫자 digits자리로 반올림한 문자열로 변환"""
+    if value == 0 or not math.isfinite(value):
+        return str(value)
+    decimals = digits - 1 - math.floor(math.log10(abs(value)))
+    return f"{round(value, decimals):,.{max(decimals, 0)}f}"
+
+def format_indicator(value):
+    """프롬프트에 넣을 지표 값 (숫자가 아니거나 값이 없으면 N/A)"""
+    if isinstance(value, (int, float)):
+        return format_significant(value)
+    return 'N/A'
+
+def indicator_at(values, index):
+    """(K, D), (상단, 중간, 하단)처럼 튜플로 계산되는 지표의 index번째 값"""
+    if isinstance(values, (list, tuple)) and index < len(values):
+        return values[index]
+    return None
+
+def price_prompt_fields(period_data):
+    """한 시간대의 지표 중 가격 분석 프롬프트에 쓰는 값만 포맷해서 평평한 dict로 반환"""
+    moving_averages = period_data.get('moving_averages') or {}
+    ema = period_data.get('ema') or {}
+    stochastic = period_data.get('stochastic')
+    bollinger_bands = period_data.get('bollinger_bands')
+    return {
+        'rsi': format_indicator(period_data.get('rsi')),
+        'stoch_k': format_indicator(indicator_at(stochastic, 0)),
+        'stoch_d': format_indicator(indicator_at(stochastic, 1)),
+        'bb_upper': format_indicator(indicator_at(bollinger_bands, 0)),
+        'bb_middle': format_indicator(indicator_at(bollinger_bands, 1)),
+        'bb_lower': format_indicator(indicator_at(bollinger_bands, 2)),
+        'ma5': format_indicator(moving_averages.get(5)),
+        'ma10': format_indicator(moving_averages.get(10)),
+        'ma20': format_indicator(moving_averages.get(20)),
+        'ma50': format_indicator(moving_averages.get(50)),
+        'ema12': format_indicator(ema.get('12')),
+        'ema26': format_indicator(ema.get('26')),
+        'atr': format_indicator(period_data.get('atr')),
+        'vwap': format_indicator(period_data.get('vwap')),
+        'mfi': format_indicator(period_data.get('mfi')),
+        'williams_r': format_indicator(period_data.get('williams_r')),
+        'cci': format_indicator(period_data.get('cci')),
+        'change_rate': format_indicator(period_data.get('change_rate'))
+    }
+
+def is_low_volatility(market_data, time_periods):
+    """모든 시간대의 변동률이 LOW_VOLATILITY_THRESHOLD 미만이고 거래량도 변화가 없는지 확인
+
+    캔들 조회에 실패한 시간대는 변동률 0.0만 채워지므로, 실제 지표가 없는 시간대가 하나라도 있으면
+    횡보로 보지 않고 LLM 분석을 그대로 진행합니다.
+    """
+    if 'error' in market_data:
+        return False
+    for period in time_periods:
+        period_data = market_data.get('analysis', {}).get(period) or {}
+        if 'error' in period_data or 'rsi' not in period_data:
+            return False
+        change_rate = period_data.get('change_rate')
+        volume_change_rate = period_data.get('volume_change_rate')
+        if not isinstance(change_rate, (int, float)) or abs(change_rate) >= LOW_VOLATILITY_THRESHOLD:
+            return False
+        if not isinstance(volume_change_rate, (int, float)) or abs(volume_change_rate) >= VOLUME_FLAT_THRESHOLD:
+            return False
+    return True
+
+# 최종 결정 응답의 JSON 디코더 (한 번만 생성)
+json_decoder = json.JSONDecoder()
+
+def first_json_object(text):
+    """첫 '{'부터 JSON 파서로 완결된 객체 하나만 읽어서 반환
+    (중첩 객체는 그대로 읽고, 뒤에 붙은 설명 텍스트나 다른 JSON은 무시)"""
+    start = text.find('{')
+    if start == -1:
+        raise json.JSONDecodeError("No valid JSON found", text, 0)
+    decision_json, _ = json_decoder.raw_decode(text, start)
+    return decision_json
+
+# 최종 결정 프롬프트의 고정 지시문 (매 주기 바이트 단위로 같은 앞부분이라 OpenAI 프롬프트 캐시가 적용될 수 있음)
+# 현재가/포지션/분석 결과 같은 주기별 값은 이 뒤에 붙임
+FINAL_DECISION_PREFIX = """당신은 암호화폐 투자 전문가이자 리스크 관리자입니다.
+스캘핑과 데이트레이딩 관점에서 단기 수익 기회를 포착하는데 집중합니다.
+아래 시장분석에서 뉴스분석과 가격분석을 종합해서 결정해주세요.
+
+[중요 제한사항]
+- 투자 비중은 반드시 0-30% 범위 내에서만 결정해야 합니다
+- 30%를 초과하는 투자 비중은 절대 제안하지 마세요
+- HOLD 결정시 반드시 투자 비중은 0%여야 합니다
+
+주요 투자 원칙:
+- 수익률이 +1% 초과 또는 -1% 초과 시 즉시 전량 매도
+- 투자 비중은 0-30% 범위로 엄격히 제한 (절대 초과 불가)
+- 투자 결정 가중치: 가격 분석 85%, 뉴스 분석 15%
+
+아래의 정확한 JSON 형식으로만 결과를 내주세요. 다른 텍스트를 추가하지 마세요:
+
+{
+    "decision": "BUY/SELL/HOLD 중 하나만 선택",
+    "percentage": "반드시 0-30 사이의 정수만 가능 (30 초과 절대 불가)",
+
+    "analysis": {
+        "market_trend": "강세/약세/중립 중 하나만 선택",
+        "market_status": "현재 시장 상황 간단 요약(50자 이내)",
+        "risk_level": "상/중/하 중 하나만 선택"
+    },
+    "signals": {
+        "technical": "강력매수/매수/중립/매도/강력매도 중 하나만 선택",
+        "news": "긍정/부정/중립 중 하나만 선택",
+        "trend": "상승/하락/횡보 중 하나만 선택"
+    },
+    "reason": "투자 결정의 주된 이유(100자 이내)"
+}
+
+[필수 규칙 - 위반 시 결과 무효]
+1. decision은 반드시 "BUY", "SELL", "HOLD" 중 하나여야 합니다 (대문자만).
+2. percentage는 반드시 0에서 30 사이의 정수여야 합니다 (30 초과 절대 불가).
+3. HOLD 결정 시 percentage는 반드시 0이어야 합니다.
+4. BUY 또는 SELL 결정 시 percentage는 1-30 사이의 정수여야 합니다.
+5. 모든 문자열은 정확히 제시된 선택지 중에서만 선택해야 합니다.
+6. 모든 점수는 정수값이어야 합니다.
+7. 모든 문자열은 큰따옴표로 감싸야 합니다.
+8. JSON 형식을 정확히 지켜야 합니다.
+9. 추가 설명이나 텍스트를 포함하지 마세요.
+"""
+
+# 뉴스 분석(LLM 호출)이 진행되는 동안 시장 데이터 수집을 병행하고, 분석 결과 저장을 뒤에서 처리하는 백그라운드 실행기
+# (작업자 1개라 제출한 순서대로 실행되고, 종료 시 남은 작업을 마친 뒤 끝남)
+io_executor = ThreadPoolExecutor(max_workers=1)
+market_data_future = None
+
+def prefetch_market_data():
+    """시장 데이터 수집을 백그라운드에서 미리 시작"""
+    global market_data_future
+    market_data_future = io_executor.submit(trader.collect_market_data)
+
+# 분석 결과는 주기 단위로 모아서 한 번에 저장
+pending_analysis_writes = {}
+
+def save_analysis_writes(writes):
+    """모아 둔 분석 결과를 하나의 트랜잭션으로 저장"""
+    try:
+        db_manager.save_analysis_cycle(**writes)
+    except Exception as e:
+        print(f"분석 결과 저장 중 오류 발생: {e}")
+
+def flush_analysis_writes():
+    """이번 주기에 쌓인 분석 결과를 백그라운드에서 저장 (거래 실행이 DB 커밋을 기다리지 않음)"""
+    if not pending_analysis_writes:
+        return
+    writes = dict(pending_analysis_writes)
+    pending_analysis_writes.clear()
+    io_executor.submit(save_analysis_writes, writes)
+
+# 뉴스 재수집 간격(초) - 뉴스는 분석 주기보다 훨씬 드물게 올라오므로 이 간격 안에서는 DB의 뉴스를 그대로 사용
+NEWS_REFRESH_SECONDS = 900
+last_news_fetch = None
+
+# 뉴스 수집기는 첫 수집 때 한 번만 생성해서 재사용 (API 키가 없으면 생성 시 예외가 발생하므로 지연 생성)
+news_collector = None
+
 def collect_latest_news():
     """최신 뉴스를 수집하고 저장"""
+    global news_collector
     try:
-        local_news_collector = NaverNewsCollector()
+        if news_collector is None:
+            news_collector = NaverNewsCollector(db_manager)
+        local_news_collector = news_collector
         total_saved = 0
         
-        for keyword in local_news_collector.search_keywords:
-            news_response = local_news_collector.collect_news(keyword, display=10)
+        # 키워드별 요청은 동시에 보내고, 중복 확인/저장은 키워드 순서대로 처리
+        for keyword, news_response in local_news_collector.collect_news_for_keywords(display=10):
             if news_response:
                 news_items = local_news_collector.process_news_data(news_response['items'])
                 if local_news_collector.save_news(news_items):
@@ -71,13 +353,16 @@ def collect_latest_news():
 
 def get_market_data_once(state: AgentState) -> dict:
     """시장 데이터를 안전하게 수집"""
+    global market_data_future
     try:
         # 이미 market_data가 있다면 재사용
         if state.get('market_data') and isinstance(state['market_data'], dict):
             return state['market_data']
             
-        if not trader.analyzer.data_queue.empty():
-            market_data = trader.analyzer.data_queue.get()
+        # 미리 시작한 수집 작업이 있으면 그 결과를 사용
+        if market_data_future is not None:
+            market_data = market_data_future.result()
+            market_data_future = None
         else:
             market_data = trader.collect_market_data()
         
@@ -87,12 +372,12 @@ def get_market_data_once(state: AgentState) -> dict:
             
         if 'current_price' in market_data:
             if not isinstance(market_data['current_price'], dict):
-                current_price_value = market_data['current_price']
+                current_price_value = float(market_data['current_price'])
                 market_data['current_price'] = {
-                    'closing_price': float(current_price_value),
-                    'opening_price': float(current_price_value),
-                    'max_price': float(current_price_value),
-                    'min_price': float(current_price_value)
+                    'closing_price': current_price_value,
+                    'opening_price': current_price_value,
+                    'max_price': current_price_value,
+                    'min_price': current_price_value
                 }
         
         state['market_data'] = market_data
@@ -114,22 +399,19 @@ def get_recent_news(dummy: str = "") -> str:
         project_name="bitcoin_agent",
         tags=["news", "data-collection"]
     ):
-        # 최신 뉴스 수집을 먼저 실행
-        collect_latest_news()
+        # 마지막 수집 후 NEWS_REFRESH_SECONDS가 지났을 때만 최신 뉴스 수집
+        # (뉴스가 그대로면 분석 프롬프트도 같아서 LLM 캐시가 응답을 재사용함)
+        global last_news_fetch
+        if last_news_fetch is None or time.monotonic() - last_news_fetch >= NEWS_REFRESH_SECONDS:
+            collect_latest_news()
+            last_news_fetch = time.monotonic()
         
-        news_df = db_manager.get_recent_news_limit()
-        #print(news_df)
-        if news_df.empty:
+        # 프롬프트용 JSON만 만들면 되므로 DataFrame을 거치지 않고 dict 목록으로 바로 조회
+        news_list = db_manager.get_recent_news_records()
+        if not news_list:
             return "최근 뉴스가 없습니다."
         
-        news_list = []
-        for _, row in news_df.iterrows():
-            news_list.append({
-                'title': row['title'],
-                'description': row['description'],
-                'pub_date': row['pub_date'].isoformat() if hasattr(row['pub_date'], 'isoformat') else str(row['pub_date'])
-            })
-        return json.dumps(news_list, ensure_ascii=False)
+        return orjson.dumps(news_list).decode('utf-8')
 
 def news_analysis_agent(state: AgentState) -> AgentState:
     """뉴스만을 분석하여 투자 제안을 하는 에이전트"""
@@ -138,12 +420,6 @@ def news_analysis_agent(state: AgentState) -> AgentState:
         project_name="bitcoin_agent",
         tags=["news", "analysis"]
     ):
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            api_key=os.getenv('OPENAI_API_KEY')
-        )
-        
         news_data = get_recent_news.invoke("")
         
         prompt = f"""당신은 암호화폐 시장의 뉴스 분석 전문가입니다.
@@ -171,7 +447,7 @@ def news_analysis_agent(state: AgentState) -> AgentState:
                     5. 종합 뉴스 영향도: (매우 부정적/-2 ~ 매우 긍정적/+2)
                     """
         
-        response = llm.invoke(prompt)
+        response = analysis_llm.invoke(prompt)
         timestamp = datetime.now()
         
         if 'results' not in state:
@@ -182,10 +458,7 @@ def news_analysis_agent(state: AgentState) -> AgentState:
             'timestamp': timestamp.isoformat()
         }
         
-        db_manager.save_news_analysis(
-            timestamp=timestamp,
-            analysis_text=response.content
-        )
+        pending_analysis_writes['news_analysis'] = (timestamp, response.content)
         
         return state
 
@@ -196,205 +469,66 @@ def price_analysis_agent(state: AgentState) -> AgentState:
         project_name="bitcoin_agent",
         tags=["price", "analysis"]
     ):
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            api_key=os.getenv('OPENAI_API_KEY')
-        )
-        
         market_data = get_market_data_once(state)
         
-        def safe_get_nested(data, *keys, default='N/A'):
-            try:
-                result = data
-                for key in keys:
-                    if isinstance(result, dict):
-                        result = result.get(key, default)
-                    elif isinstance(result, (list, tuple)) and isinstance(key, int):
-                        result = result[key] if 0 <= key < len(result) else default
-                    else:
-                        return default
-                return result if result is not None else default
-            except Exception as e:
-                print(f"Error accessing {keys}: {str(e)}")
-                return default
-
-        def format_number(value, default='N/A'):
-            if value == 'N/A':
-                return value
-            try:
-                if isinstance(value, (int, float)):
-                    return f"{value:,.2f}"
-                return str(default)
-            except:
-                return str(default)
-        
         try:
             # 모든 시간대의 분석 데이터 가져오기
             time_periods = ['1m', '3m', '5m', '10m', '15m', '30m']
-            analysis_data = {}
             
-            for period in time_periods:
-                analysis_data[period] = safe_get_nested(market_data, 'analysis', period, default={})
-                
-            current_price = safe_get_nested(market_data, 'current_price', 'closing_price', default=0)
+            price_info = market_data.get('current_price')
+            current_price = (price_info.get('closing_price') or 0) if isinstance(price_info, dict) else 0
             
-            # 각 시간대별 분석 데이터 구성
-            analysis_by_period = {}
-            for period in time_periods:
-                period_data = analysis_data[period]
-                
-                # 이동평균선 데이터 처리
-                moving_averages = period_data.get('moving_averages', {})
-                
-                analysis_by_period[period] = {
-                    'MA': {
-                        'MA5': format_number(safe_get_nested(moving_averages, 5)),
-                        'MA10': format_number(safe_get_nested(moving_averages, 10)),
-                        'MA20': format_number(safe_get_nested(moving_averages, 20)),
-                        'MA50': format_number(safe_get_nested(moving_averages, 50)),
-                        'MA200': format_number(safe_get_nested(moving_averages, 200))
-                    },
-                    'RSI': format_number(safe_get_nested(period_data, 'rsi')),
-                    'Stochastic': {
-                        'K': format_number(safe_get_nested(period_data, 'stochastic', 0)),
-                        'D': format_number(safe_get_nested(period_data, 'stochastic', 1))
-                    },
-                    'BB': {
-                        'Upper': format_number(safe_get_nested(period_data, 'bollinger_bands', 0)),
-                        'Middle': format_number(safe_get_nested(period_data, 'bollinger_bands', 1)),
-                        'Lower': format_number(safe_get_nested(period_data, 'bollinger_bands', 2))
-                    },
-                    'EMA': {
-                        'EMA12': format_number(safe_get_nested(period_data, 'ema', '12')),
-                        'EMA26': format_number(safe_get_nested(period_data, 'ema', '26'))
-                    },
-                    'DMI': {
-                        '+DI': format_number(safe_get_nested(period_data, 'dmi', 0)),
-                        '-DI': format_number(safe_get_nested(period_data, 'dmi', 1)),
-                        'ADX': format_number(safe_get_nested(period_data, 'dmi', 2))
-                    },
-                    'ATR': format_number(safe_get_nested(period_data, 'atr')),
-                    'OBV': format_number(safe_get_nested(period_data, 'obv')),
-                    'VWAP': format_number(safe_get_nested(period_data, 'vwap')),
-                    'MFI': format_number(safe_get_nested(period_data, 'mfi')),
-                    'Williams_R': format_number(safe_get_nested(period_data, 'williams_r')),
-                    'CCI': format_number(safe_get_nested(period_data, 'cci')),
-                    'Change_Rate': format_number(safe_get_nested(period_data, 'change_rate'))
+            # 횡보 구간에서는 LLM을 호출하지 않고 관망 의견으로 대체
+            if is_low_volatility(market_data, time_periods):
+                analysis_text = (
+                    f"1. 투자 판단\n   - 투자결정: 관망\n   - 투자비중: 0%\n"
+                    f"2. 주요 시그널 분석\n   - 1~30분 변동률이 모두 ±{LOW_VOLATILITY_THRESHOLD}% 미만이고 "
+                    f"거래량 변화도 ±{VOLUME_FLAT_THRESHOLD}% 미만인 횡보 구간\n"
+                    f"4. 종합 점수: 0"
+                )
+                print(f"\n[가격 분석] 변동성이 낮아 LLM 분석을 생략합니다.\n{analysis_text}")
+                timestamp = datetime.now()
+                state['results']['price_analysis'] = {
+                    'analysis': analysis_text,
+                    'timestamp': timestamp.isoformat()
                 }
+                pending_analysis_writes['price_analysis'] = (timestamp, current_price, analysis_text)
+                return state
             
-            # 프롬프트 구성
-            prompt = f"""당신은 암호화폐 기술적 분석 전문가입니다. 
-            다음 데이터를 기반으로 투자 결정을 내려주세요.
-            
-            현재가: {format_number(current_price)}원
-            
-            === 각 시간대별 변동률 ===
-            1분: {analysis_by_period['1m']['Change_Rate']}%
-            3분: {analysis_by_period['3m']['Change_Rate']}%
-            5분: {analysis_by_period['5m']['Change_Rate']}%
-            10분: {analysis_by_period['10m']['Change_Rate']}%
-            15분: {analysis_by_period['15m']['Change_Rate']}%
-            30분: {analysis_by_period['30m']['Change_Rate']}%
-            """
-            
-            # 각 시간대별 데이터를 프롬프트에 추가
-            for period in time_periods:
-
-                period_name = {
-                    '1m': '1분',
-                    '3m': '3분',
-                    '5m': '5분',
-                    '10m': '10분',
-                    '15m': '15분',
-                    '30m': '30분',
-                }[period]
-                
-                data = analysis_by_period[period]
-                prompt += f"""
-                === {period_name} 기준 지표 ===
-                - RSI(14): {data['RSI']}
-                - Stochastic K/D: {data['Stochastic']['K']}/{data['Stochastic']['D']}
-                - 볼린저 밴드: 
-                  상단: {data['BB']['Upper']}
-                  중간: {data['BB']['Middle']}
-                  하단: {data['BB']['Lower']}
-                - 이동평균선:
-                  MA5: {data['MA']['MA5']}
-                  MA10: {data['MA']['MA10']}
-                  MA20: {data['MA']['MA20']}
-                  MA50: {data['MA']['MA50']}
-                - EMA:
-                EMA12: {data['EMA']['EMA12']}
-                EMA26: {data['EMA']['EMA26']}
-                - ATR: {data['ATR']}
-                - VWAP: {data['VWAP']}
-                - MFI: {data['MFI']}
-                - Williams %R: {data['Williams_R']}
-                - CCI: {data['CCI']}
-                - 변동률: {data['Change_Rate']}%
-                """
-            
-            prompt += f"""
-            [시장 분석 기준]
-            1. 추세 강도 판단
-               - 이동평균선 배열
-               - 추세선 저항/지지
-               - 추세 모멘텀 지속성
-            
-            2. 단기 반전 신호
-               - RSI, Stochastic 다이버전스
-               - 볼린저 밴드 침투
-               - 거래량 급증 구간
-            
-            3. 매매 시점 정밀도
-               - 15분봉 이하 단기 차트 우선
-               - 복합 지표 확증 신호
-               - 거래량 프로필 기반 가격대 분석
-            
-            4. 리스크 관리
-               - 변동성 기반 손절가
-               - 예상 손익비
-               - 포지션 진입 타이밍
-            
-            다음 형식으로 분석 결과를 제공해주세요:
-            1. 투자 판단
-               - 투자결정: (매수/매도/관망)
-               - 투자비중: (0-100%)
-               - 목표가/손절가
-               - 예상 진입 유지 시간
-            
-            2. 주요 시그널 분석
-               - 단기(1-5분): 주요 전환점/강도
-               - 중기(10-30분): 추세 방향/강도
-               - 거래량 특이점
-               - 주목할 기술적 패턴
-            
-            3. 리스크 평가
-               - 반전 가능성
-               - 변동성 수준
-               - 거래량 리스크
-               - 추천 레버리지 배수
-            
-            4. 종합 점수: (-5 ~ +5)
-               음수: 하락 가능성
-               양수: 상승 가능성
-               절대값: 신뢰도
-               """
+            # 시간대별로 프롬프트에 들어가는 지표만 한 번에 꺼내서 문자열로 변환
+            analysis = market_data.get('analysis') or {}
+            fields_by_period = {period: price_prompt_fields(analysis.get(period) or {}) for period in time_periods}
             
-            response = llm.invoke(prompt)
+            # 프롬프트 구성 (모듈 상수 템플릿에 값만 채우고 한 번에 연결)
+            change_rates = "\n".join(
+                f"{PERIOD_NAMES[period]}: {fields_by_period[period]['change_rate']}%" for period in time_periods
+            )
+            period_blocks = [
+                PRICE_PERIOD_TEMPLATE.format(period_name=PERIOD_NAMES[period], **fields_by_period[period])
+                for period in time_periods
+            ]
+            prompt = "".join([
+                PRICE_PROMPT_HEADER.format(current_price=format_indicator(current_price), change_rates=change_rates),
+                *period_blocks,
+                PRICE_PROMPT_FOOTER
+            ])
+            
+            # 응답을 받는 대로 출력 (전체 응답을 기다리지 않고 진행 상황 확인)
+            print("\n[가격 분석]")
+            chunks = []
+            for chunk in analysis_llm.stream(prompt):
+                print(chunk.content, end='', flush=True)
+                chunks.append(chunk.content)
+            print()
+            analysis_text = ''.join(chunks)
             timestamp = datetime.now()
             
             state['results']['price_analysis'] = {
-                'analysis': response.content,
+                'analysis': analysis_text,
                 'timestamp': timestamp.isoformat()
             }
             
-            db_manager.save_price_analysis(
-                timestamp=timestamp,
-                current_price=current_price,
-                analysis_text=response.content
-            )
+            pending_analysis_writes['price_analysis'] = (timestamp, current_price, analysis_text)
             
         except Exception as e:
             print(f"Error in price analysis: {str(e)}")
@@ -405,18 +539,27 @@ def price_analysis_agent(state: AgentState) -> AgentState:
         
         return state
     
+# 뉴스 분석 LLM 호출을 가격 분석과 동시에 실행하기 위한 실행기
+analysis_executor = ThreadPoolExecutor(max_workers=1)
+
+def market_analysis_agent(state: AgentState) -> AgentState:
+    """뉴스 분석과 가격 분석을 동시에 실행하는 에이전트
+
+    두 분석은 서로의 결과를 사용하지 않고 최종 결정에서만 합쳐지므로, 뉴스 분석은 백그라운드에서
+    실행하고 그동안 가격 분석을 진행합니다. 각각 results/pending_analysis_writes의 서로 다른 키에만 씁니다.
+    """
+    # LangSmith 추적 컨텍스트를 넘겨서 뉴스 분석도 같은 전체 분석 추적 아래에 기록되도록 함
+    news_future = analysis_executor.submit(contextvars.copy_context().run, news_analysis_agent, state)
+    price_analysis_agent(state)
+    news_future.result()
+    return state
+
 def final_decision_agent(state: AgentState) -> AgentState:
     with langsmith.trace(
         name="final_decision_agent",
         project_name="bitcoin_agent",
         tags=["final", "decision"]
     ):
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.2,
-            api_key=os.getenv('OPENAI_API_KEY')
-        )
-        
         market_data = get_market_data_once(state)
         current_price = 0
         
@@ -431,24 +574,6 @@ def final_decision_agent(state: AgentState) -> AgentState:
         except Exception as e:
             print(f"Error extracting current price: {e}")
 
-        try:
-            position = trade_executor.get_current_position()
-            avg_price = position.get('avg_price', 0)
-            quantity = position.get('total_quantity', 0)
-            investment = position.get('total_investment', 0)
-            
-            profit_rate = ((current_price - avg_price) / avg_price * 100) if avg_price > 0 else 0
-            
-            position_text = f"""현재 보유 포지션:
-            - 평균 매수가: {avg_price:,.0f}원
-            - 현재 수익률: {profit_rate:.2f}%
-            - 총 투자금액: {investment:,.0f}원
-            - 보유 수량: {quantity:.8f} {SYMBOL}"""
-
-        except Exception as e:
-            print(f"포지션 정보 조회 실패: {e}")
-            position_text = "현재 보유 중인 포지션이 없습니다."
-
         try:
             position = trade_executor.get_current_position()
             avg_price = position.get('avg_price', 0)
@@ -483,11 +608,9 @@ def final_decision_agent(state: AgentState) -> AgentState:
                     'timestamp': datetime.now().isoformat()
                 }
 
-                                # JSON으로 저장할 때 한글 인코딩 처리
-                db_manager.save_final_decision(
-                    timestamp=datetime.now(),
-                    current_price=current_price,
-                    analysis_text=json.dumps(auto_decision, ensure_ascii=False)
+                # JSON으로 저장할 때 한글 인코딩 처리
+                pending_analysis_writes['final_decision'] = (
+                    datetime.now(), current_price, orjson.dumps(auto_decision).decode('utf-8')
                 )
                 
                 return state
@@ -502,93 +625,37 @@ def final_decision_agent(state: AgentState) -> AgentState:
             print(f"포지션 정보 조회 실패: {e}")
             position_text = "현재 보유 중인 포지션이 없습니다."
 
-        prompt = f"""
-        당신은 암호화폐 투자 전문가이자 리스크 관리자입니다.
-        스캘핑과 데이트레이딩 관점에서 단기 수익 기회를 포착하는데 집중합니다.
-        아래 시장분석에서 뉴스분석과 가격분석을 종합해서 결정해주세요.
-
-        [중요 제한사항]
-        - 투자 비중은 반드시 0-30% 범위 내에서만 결정해야 합니다
-        - 30%를 초과하는 투자 비중은 절대 제안하지 마세요
-        - HOLD 결정시 반드시 투자 비중은 0%여야 합니다
-
-        주요 투자 원칙:
-        - 수익률이 +1% 초과 또는 -1% 초과 시 즉시 전량 매도
-        - 투자 비중은 0-30% 범위로 엄격히 제한 (절대 초과 불가)
-        - 투자 결정 가중치: 가격 분석 85%, 뉴스 분석 15%
-
-        시장 현황:
-        현재가: {current_price:,.0f}원
+        # 고정 지시문을 앞에 두고 매 주기 바뀌는 값은 뒤에 붙여서, 앞부분이 항상 같은 프롬프트가 되도록 함
+        prompt = FINAL_DECISION_PREFIX + f"""
+시장 현황:
+현재가: {current_price:,.0f}원
 
-        포지션 분석:
-        {position_text}
+포지션 분석:
+{position_text}
 
-        시장 분석:
-        [뉴스 분석]
-        {state['results']['news_analysis']['analysis']}
+시장 분석:
+[뉴스 분석]
+{state['results']['news_analysis']['analysis']}
 
-        [기술적 분석]
-        {state['results']['price_analysis']['analysis']}
+[기술적 분석]
+{state['results']['price_analysis']['analysis']}
+"""
 
-
-        아래의 정확한 JSON 형식으로만 결과를 내주세요. 다른 텍스트를 추가하지 마세요:
-
-        {{
-            "decision": "BUY/SELL/HOLD 중 하나만 선택",
-            "percentage": "반드시 0-30 사이의 정수만 가능 (30 초과 절대 불가)",
-            
-            "analysis": {{
-                "market_trend": "강세/약세/중립 중 하나만 선택",
-                "market_status": "현재 시장 상황 간단 요약(50자 이내)",
-                "risk_level": "상/중/하 중 하나만 선택"
-            }},
-            "signals": {{
-                "technical": "강력매수/매수/중립/매도/강력매도 중 하나만 선택",
-                "news": "긍정/부정/중립 중 하나만 선택",
-                "trend": "상승/하락/횡보 중 하나만 선택"
-            }},
-            "reason": "투자 결정의 주된 이유(100자 이내)"
-        }}
-
-        [필수 규칙 - 위반 시 결과 무효]
-        1. decision은 반드시 "BUY", "SELL", "HOLD" 중 하나여야 합니다 (대문자만).
-        2. percentage는 반드시 0에서 30 사이의 정수여야 합니다 (30 초과 절대 불가).
-        3. HOLD 결정 시 percentage는 반드시 0이어야 합니다.
-        4. BUY 또는 SELL 결정 시 percentage는 1-30 사이의 정수여야 합니다.
-        5. 모든 문자열은 정확히 제시된 선택지 중에서만 선택해야 합니다.
-        6. 모든 점수는 정수값이어야 합니다.
-        7. 모든 문자열은 큰따옴표로 감싸야 합니다.
-        8. JSON 형식을 정확히 지켜야 합니다.
-        9. 추가 설명이나 텍스트를 포함하지 마세요.
-        """
-
-        response = llm.invoke(prompt)
+        response = decision_llm.invoke(prompt)
         timestamp = datetime.now()
         
         try:
             # 응답에서 JSON 부분만 추출 (추가 텍스트가 있을 경우를 대비)
-            response_text = response.content.strip()
-            if response_text.startswith('{') and response_text.endswith('}'):
-                decision_json = json.loads(response_text)
-            else:
-                # JSON이 아닌 텍스트가 포함된 경우, JSON 부분만 추출 시도
-                import re
-                json_match = re.search(r'\{[^{]*\}', response_text)
-                if json_match:
-                    decision_json = json.loads(json_match.group(0))
-                else:
-                    raise json.JSONDecodeError("No valid JSON found", response_text, 0)
+            decision_json = first_json_object(response.content)
             
             state['results']['final_decision'] = {
                 'decision': decision_json,
                 'timestamp': timestamp.isoformat()
             }
 
-                        # JSON으로 저장할 때 한글 인코딩 처리
-            db_manager.save_final_decision(
-                timestamp=datetime.now(),
-                current_price=current_price,
-                analysis_text=json.dumps(decision_json, ensure_ascii=False, indent=2)
+            # JSON으로 저장할 때 한글 인코딩 처리
+            pending_analysis_writes['final_decision'] = (
+                datetime.now(), current_price, orjson.dumps(decision_json, option=orjson.OPT_INDENT_2).decode('utf-8')
             )
             
         except json.JSONDecodeError as e:
@@ -616,10 +683,8 @@ def final_decision_agent(state: AgentState) -> AgentState:
                 'timestamp': datetime.now().isoformat()
             }
             
-            db_manager.save_final_decision(
-                timestamp=datetime.now(),
-                current_price=current_price,
-                analysis_text=json.dumps(default_decision, ensure_ascii=False, indent=2)
+            pending_analysis_writes['final_decision'] = (
+                datetime.now(), current_price, orjson.dumps(default_decision, option=orjson.OPT_INDENT_2).decode('utf-8')
             )
         
         return state
@@ -648,40 +713,35 @@ def execute_trading_decision(state: AgentState) -> None:
                 current_price=current_price
             )
             
-            # 거래 결과 출력
+            # 거래 결과 출력 (직렬화할 수 없는 값이 섞여 있어도 출력 때문에 거래가 오류로 기록되지 않도록 문자열로 변환)
             print("\n=== 거래 실행 결과 ===")
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(orjson.dumps(result, default=str, option=orjson.OPT_INDENT_2).decode('utf-8'))
             
-            # HOLD 타입일 경우 별도 처리
+            # 결과 유형별로 저장할 값만 정하고 저장은 한 번만 호출
+            order_suffix = timestamp.strftime('%Y%m%d%H%M%S')
             if result.get('type') == 'HOLD':
-                db_manager.save_trade_execution(
-                    timestamp=timestamp,
-                    trade_type='HOLD',
-                    quantity=0,
-                    price=current_price,
-                    total_amount=0,
-                    order_id=f"HOLD_{timestamp.strftime('%Y%m%d%H%M%S')}"
-                )
+                trade_type, quantity, price, total_amount = 'HOLD', 0, current_price, 0
+                order_id = f"HOLD_{order_suffix}"
             # 실제 거래 케이스 처리
             elif result['status'] == 'SUCCESS':
-                db_manager.save_trade_execution(
-                    timestamp=timestamp,
-                    trade_type=result['type'],
-                    quantity=result.get('quantity', 0),
-                    price=result.get('price', current_price),
-                    total_amount=result.get('total_amount', 0),
-                    order_id=result.get('order_id', f"{result['type']}_{timestamp.strftime('%Y%m%d%H%M%S')}")
-                )
+                trade_type = result['type']
+                quantity = result.get('quantity', 0)
+                price = result.get('price', current_price)
+                total_amount = result.get('total_amount', 0)
+                order_id = result.get('order_id', f"{trade_type}_{order_suffix}")
             # 에러 케이스 처리
             else:
-                db_manager.save_trade_execution(
-                    timestamp=timestamp,
-                    trade_type=result.get('type', 'ERROR'),
-                    quantity=0,
-                    price=current_price,
-                    total_amount=0,
-                    order_id=f"ERROR_{timestamp.strftime('%Y%m%d%H%M%S')}"
-                )
+                trade_type, quantity, price, total_amount = result.get('type', 'ERROR'), 0, current_price, 0
+                order_id = f"ERROR_{order_suffix}"
+            
+            db_manager.save_trade_execution(
+                timestamp=timestamp,
+                trade_type=trade_type,
+                quantity=quantity,
+                price=price,
+                total_amount=total_amount,
+                order_id=order_id
+            )
                 
         except Exception as e:
             print(f"거래 실행 중 오류 발생: {str(e)}")
@@ -705,17 +765,15 @@ def create_trading_workflow() -> Graph:
     """트레이딩 워크플로우 생성"""
     workflow = StateGraph(AgentState)
     
-    # 노드 추가
-    workflow.add_node("news_analysis", news_analysis_agent)
-    workflow.add_node("price_analysis", price_analysis_agent)
+    # 노드 추가 (뉴스/가격 분석은 market_analysis 안에서 동시에 실행)
+    workflow.add_node("market_analysis", market_analysis_agent)
     workflow.add_node("final_decision", final_decision_agent)
     
     # 엣지 추가 (실행 순서 정의)
-    workflow.add_edge("news_analysis", "price_analysis")
-    workflow.add_edge("price_analysis", "final_decision")
+    workflow.add_edge("market_analysis", "final_decision")
     
     # 시작점과 종료점 설정
-    workflow.set_entry_point("news_analysis")
+    workflow.set_entry_point("market_analysis")
     workflow.set_finish_point("final_decision")
     
     return workflow.compile()
@@ -724,10 +782,14 @@ def run_trading_analysis():
     """트레이딩 분석 실행"""
     try:
         print("트레이딩 분석 시작 (LangSmith 모니터링 활성화)")
+        # 시장 데이터 수집을 가장 먼저 백그라운드로 시작해서 워크플로우 구성/뉴스 수집과 겹쳐서 실행
+        # (가격 분석은 이 결과를 받아 쓰고, 직접 API를 호출하는 경우는 수집이 시작되지 않았을 때뿐)
+        prefetch_market_data()
+        
         app = create_trading_workflow()
         config = {
             "messages": [], 
-            "next_step": "news_analysis",
+            "next_step": "market_analysis",
             "results": {},
             "market_data": {}
         }
@@ -737,7 +799,11 @@ def run_trading_analysis():
             project_name="bitcoin_agent",
             tags=["workflow", "complete"]
         ) as tracer:
-            result = app.invoke(config)
+            try:
+                result = app.invoke(config)
+            finally:
+                # 이번 주기의 분석 결과를 한 트랜잭션으로 저장
+                flush_analysis_writes()
             
             if 'results' in result:
                 print("\n=== 분석 결과 ===")
@@ -745,9 +811,7 @@ def run_trading_analysis():
                     print("\n[뉴스 분석]")
                     print(result['results']['news_analysis']['analysis'])
                 
-                if 'price_analysis' in result['results']:
-                    print("\n[가격 분석]")
-                    print(result['results']['price_analysis']['analysis'])
+                # 가격 분석은 price_analysis_agent에서 스트리밍으로 이미 출력됨
                 
                 if 'final_decision' in result['results']:
                     print("\n[최종 결정]")
@@ -766,6 +830,8 @@ def run_continuous_analysis():
     """30분마다 트레이딩 분석을 실행하는 연속 실행 함수"""
     WAIT_MINUTES = 1
     WAIT_SECONDS = WAIT_MINUTES * 60  # 30분을 초로 변환
+    MAX_RETRY_SECONDS = 600  # 연속 실패 시 재시도 대기 시간 상한 (지수 백오프)
+    fail_count = 0
     
     print("연속 트레이딩 분석 시작...")
     print(f"실행 간격: {WAIT_MINUTES}분")
@@ -775,28 +841,33 @@ def run_continuous_analysis():
         try:
             # 현재 시간 출력
             current_time = datetime.now()
+            cycle_start = time.monotonic()
             print(f"\n{'='*50}")
             print(f"새로운 분석 시작 시간: {current_time}")
             print(f"{'='*50}\n")
             
             # 트레이딩 분석 실행
             run_trading_analysis()
+            fail_count = 0
             
-            # 다음 실행까지 대기
+            # 다음 실행까지 대기 (분석에 걸린 시간을 빼서 주기 시작 시각 기준으로 간격 유지)
             next_run_time = current_time + timedelta(minutes=WAIT_MINUTES)
+            wait_seconds = max(0, WAIT_SECONDS - (time.monotonic() - cycle_start))
             print(f"\n다음 분석 예정 시간: {next_run_time}")
-            print(f"다음 분석까지 {WAIT_MINUTES}분 대기 중...")
+            print(f"다음 분석까지 {wait_seconds:.0f}초 대기 중...")
             
-            # 지정된 시간만큼 대기
-            time.sleep(WAIT_SECONDS)
+            time.sleep(wait_seconds)
             
         except KeyboardInterrupt:
             print("\n프로그램이 사용자에 의해 종료되었습니다.")
             break
         except Exception as e:
+            fail_count += 1
+            # 장애가 이어지면 대기 시간을 두 배씩 늘려 API/LLM 호출이 몰리지 않도록 함
+            retry_seconds = min(MAX_RETRY_SECONDS, WAIT_SECONDS * 2 ** (fail_count - 1)) + random.uniform(0, 5)
             print(f"예기치 않은 오류 발생: {e}")
-            print(f"{WAIT_MINUTES}분 후 다시 시도합니다...")
-            time.sleep(WAIT_SECONDS)
+            print(f"연속 {fail_count}회 실패 - {retry_seconds:.0f}초 후 다시 시도합니다...")
+            time.sleep(retry_seconds)
 
 if __name__ == "__main__":
     # 단일 실행 대신 연속 실행 함수를 호출
@@ -1,19 +1,34 @@
 # news_collector.py
 import os
 import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from database_manager import DatabaseManager
-import sqlite3
+
+# 키워드마다 새 TCP/TLS 연결을 맺지 않도록 네이버 API 연결을 재사용하는 공용 세션
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# 키워드별 뉴스 검색 요청을 동시에 보내기 위한 스레드 풀 (공용 세션의 연결 수 안에서 실행)
+fetch_executor = ThreadPoolExecutor(max_workers=4)
 
 class NaverNewsCollector:
-    def __init__(self):
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
         load_dotenv()
         self.client_id = os.getenv('NAVER_CLIENT_ID')
         self.client_secret = os.getenv('NAVER_CLIENT_SECRET')
-        self.db_manager = DatabaseManager()
+        # 호출하는 쪽의 DB 매니저가 있으면 그 연결을 그대로 사용
+        self.db_manager = db_manager or DatabaseManager()
         self.search_keywords = ["비트코인", "bitcoin","코인","도지코인","도지","DOGE","알트코인", 
                                 "altcoin",  "가상자산", "디지털자산", "코인거래소", "crypto exchange", 
                                 "블록체인", "blockchain",]
@@ -36,17 +51,27 @@ class NaverNewsCollector:
         }
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = http_session.get(url, headers=headers, params=params, timeout=5)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return orjson.loads(response.content)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             print(f"뉴스 수집 중 오류 발생: {e}")
             return None
 
+    def collect_news_for_keywords(self, display: int = 10) -> List[tuple]:
+        """모든 검색 키워드의 뉴스를 동시에 요청해서 (키워드, 응답) 목록으로 반환
+
+        키워드 수 x 왕복 시간 대신 가장 느린 요청 몇 개의 시간만 걸립니다.
+        결과는 search_keywords 순서를 유지하므로 중복 확인/저장은 기존처럼 키워드 순서대로 처리합니다.
+        """
+        responses = fetch_executor.map(lambda keyword: self.collect_news(keyword, display=display),
+                                       self.search_keywords)
+        return list(zip(self.search_keywords, responses))
+
     def is_duplicate_news(self, title: str, pub_date: datetime) -> bool:
         """중복된 뉴스인지 확인"""
         try:
-            with sqlite3.connect(self.db_manager.db_path) as conn:
+            with self.db_manager.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT COUNT(*) FROM news 
@@ -78,12 +103,11 @@ class NaverNewsCollector:
     def save_news(self, news_data: List[Dict]) -> bool:
         """뉴스 데이터를 데이터베이스에 저장"""
         try:
-            for news_item in news_data:
-                self.db_manager.save_news(
-                    title=news_item['title'],
-                    description=news_item['description'],
-                    pub_date=news_item['pub_date']
-                )
+            # 기사마다 커밋하지 않고 키워드 단위로 한 번에 저장
+            self.db_manager.save_news_many(
+                (news_item['title'], news_item['description'], news_item['pub_date'])
+                for news_item in news_data
+            )
             return True
         except Exception as e:
             print(f"뉴스 저장 중 오류 발생: {e}")
@@ -95,10 +119,8 @@ def collect_and_save_news():
         collector = NaverNewsCollector()
         total_saved = 0
         
-        for keyword in collector.search_keywords:
-            print(f"\n{keyword} 관련 뉴스 수집 중...")
-            news_response = collector.collect_news(keyword, display=10)
-            
+        print(f"\n{len(collector.search_keywords)}개 키워드 뉴스 수집 중...")
+        for keyword, news_response in collector.collect_news_for_keywords(display=10):
             if not news_response:
                 print(f"{keyword} 뉴스 데이터를 가져오지 못했습니다.")
                 continue
@@ -2,12 +2,18 @@ import numpy as np
 import pandas as pd
 from typing import Dict, Optional
 import os
-import pyupbit
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from queue import Queue
 from datetime import datetime
 from dotenv import load_dotenv
 from technical_indicator import TechnicalIndicators
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 
 class MarketDataAnalyzer:
     def __init__(self):
@@ -38,6 +44,18 @@ class MarketDataAnalyzer:
             'cci': self.indicators.calculate_cci(high, low, close)
         }
 
+UPBIT_API_URL = "https://api.upbit.com/v1"
+
+# 캔들 DataFrame 열 이름 -> 업비트 캔들 응답 키
+CANDLE_COLUMNS = {
+    'open': 'opening_price',
+    'high': 'high_price',
+    'low': 'low_price',
+    'close': 'trade_price',
+    'volume': 'candle_acc_trade_volume'
+}
+candle_values = itemgetter(*CANDLE_COLUMNS.values())
+
 class UpbitTrader:
     def __init__(self):
         """업비트 트레이더 초기화"""
@@ -45,11 +63,44 @@ class UpbitTrader:
         self.symbol = os.getenv('COIN', 'BTC')
         self.market = f"KRW-{self.symbol}"
         self.analyzer = MarketDataAnalyzer()
+        # 분봉 6종 + 일봉 요청을 동시에 보내기 위한 스레드 풀
+        self.fetch_executor = ThreadPoolExecutor(max_workers=7)
+        # 매 주기 새 TCP/TLS 연결을 맺지 않도록 업비트 시세 API 연결을 재사용하는 세션
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+
+    def _get_quotation(self, path: str, **params):
+        """업비트 시세 API 호출 (응답이 없을 때 무한정 기다리지 않도록 타임아웃 지정)"""
+        response = self.session.get(f"{UPBIT_API_URL}/{path}", params=params, timeout=(3, 10))
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def get_candles(self, path: str, count: int) -> Optional[pd.DataFrame]:
+        """캔들 데이터 조회 (시간순 정렬, open/high/low/close/volume 열)"""
+        rows = self._get_quotation(f"candles/{path}", market=self.market, count=count)
+        if not rows:
+            return None
+        
+        rows = rows[::-1]  # API는 최신순으로 반환 -> 시간순으로 정렬
+        
+        # 열마다 응답 전체를 다시 순회하지 않고, 행마다 필요한 필드를 itemgetter로 한 번에 꺼내
+        # (캔들 수, 5) float64 배열로 바로 구성
+        values = np.array(list(map(candle_values, rows)), dtype=np.float64)
+        
+        return pd.DataFrame(
+            values,
+            columns=list(CANDLE_COLUMNS),
+            index=pd.to_datetime([row['candle_date_time_kst'] for row in rows], format='ISO8601')
+        )
 
     def get_current_price(self) -> Optional[Dict]:
         """현재가 정보 조회"""
         try:
-            ticker = pyupbit.get_current_price(self.market)
+            ticker = self._get_quotation("ticker", markets=self.market)[0]['trade_price']
             if ticker:
                 return {
                     'closing_price': ticker,
@@ -65,8 +116,7 @@ class UpbitTrader:
     def get_minute_candles(self, unit: int = 1, count: int = 200) -> Optional[pd.DataFrame]:
         """분봉 데이터 조회"""
         try:
-            df = pyupbit.get_ohlcv(self.market, interval=f"minute{unit}", count=count)
-            return df
+            return self.get_candles(f"minutes/{unit}", count)
         except Exception as e:
             print(f"{unit}분봉 데이터 조회 실패: {e}")
             return None
@@ -86,10 +136,18 @@ class UpbitTrader:
 
             analysis_results = {}
             
+            # 분봉/일봉 요청은 서로 독립적이므로 한 번에 보내고 순서대로 결과를 받음
+            # (요청 수 x 왕복 시간 -> 가장 느린 요청 하나의 시간)
+            candle_futures = {
+                unit: self.fetch_executor.submit(self.get_minute_candles, unit, 200)
+                for unit in [1, 3, 5, 10, 15, 30]
+            }
+            day_future = self.fetch_executor.submit(self.get_candles, "days", 1)
+            
             # 분봉 데이터 수집 및 분석
-            for unit in [1, 3, 5, 10, 15, 30]:
+            for unit, candle_future in candle_futures.items():
                 try:
-                    df = self.get_minute_candles(unit, count=200)
+                    df = candle_future.result()
                     if df is not None and not df.empty:
                         prices = df['close'].values
                         highs = df['high'].values
@@ -99,6 +157,11 @@ class UpbitTrader:
                         change_rate = ((prices[-1] - prices[-unit]) / prices[-unit] * 100 
                                      if len(prices) >= unit else 0)
 
+                        # 직전 20봉 평균 대비 최근 봉 거래량 변화율 (평균 거래량이 0이면 계산하지 않음)
+                        avg_volume = volumes[-21:-1].mean() if len(volumes) > 1 else 0
+                        volume_change_rate = ((volumes[-1] - avg_volume) / avg_volume * 100
+                                              if avg_volume > 0 else None)
+
                         analysis_results[f'{unit}m'] = {
                             'moving_averages': self.analyzer.indicators.calculate_moving_averages(prices),
                             'ema': {
@@ -115,14 +178,19 @@ class UpbitTrader:
                             'mfi': self.analyzer.indicators.calculate_mfi(highs, lows, prices, volumes),
                             'williams_r': self.analyzer.indicators.calculate_williams_r(highs, lows, prices),
                             'cci': self.analyzer.indicators.calculate_cci(highs, lows, prices),
-                            'change_rate': change_rate
+                            'change_rate': change_rate,
+                            'volume_change_rate': volume_change_rate
                         }
                 except Exception as e:
                     print(f"{unit}분봉 처리 중 오류: {e}")
                     analysis_results[f'{unit}m'] = {'change_rate': 0.0}
 
             # 24시간 데이터 추가
-            day_df = pyupbit.get_ohlcv(self.market, interval="day", count=1)
+            try:
+                day_df = day_future.result()
+            except Exception as e:
+                print(f"일봉 데이터 조회 실패: {e}")
+                day_df = None
             if day_df is not None and not day_df.empty:
                 day_change = ((day_df['close'].iloc[-1] - day_df['open'].iloc[-1]) / 
                             day_df['open'].iloc[-1] * 100)
@@ -146,65 +214,73 @@ class UpbitTrader:
         print(f"데이터 수집 시작 - {self.symbol}")
         print(f"수집 간격: {interval}초")
         
+        max_retry_seconds = 600  # 연속 실패 시 재시도 대기 시간 상한 (지수 백오프)
+        fail_count = 0
+        
         while True:
             try:
                 market_data = self.collect_market_data()
-                if market_data:
-                    print(f"\n{market_data['timestamp']} - 데이터 수집 및 분석 완료")
-                    print(f"현재가: {market_data['current_price']:,.0f} KRW")
-                    
-                    # 변동률 출력
-                    print("\n각 시간대별 변동률:")
-                    for timeframe in ['1m', '3m', '5m', '10m', '15m', '30m', '24h']:
-                        if timeframe in market_data['analysis']:
-                            print(f"{timeframe}: {market_data['analysis'][timeframe]['change_rate']:.2f}%")
-                    
-                    # 기술적 지표 출력
-                    for timeframe in ['1m', '3m', '5m', '10m', '15m', '30m']:
-                        if timeframe in market_data['analysis']:
-                            analysis = market_data['analysis'][timeframe]
-                            print(f"\n{timeframe} 기술적 지표:")
-                            
-                            if 'rsi' in analysis:
-                                print(f"RSI(14): {analysis['rsi']:.2f}")
-                            
-                            if 'bollinger_bands' in analysis and all(x is not None for x in analysis['bollinger_bands']):
-                                bb = analysis['bollinger_bands']
-                                print(f"볼린저 밴드: {bb[0]:,.0f} / {bb[1]:,.0f} / {bb[2]:,.0f}")
-                            
-                            if 'moving_averages' in analysis:
-                                print("이동평균선:")
-                                for period, value in analysis['moving_averages'].items():
-                                    print(f"  MA{period}: {value:,.0f}")
-                            
-                            if 'stochastic' in analysis and all(x is not None for x in analysis['stochastic']):
-                                k, d = analysis['stochastic']
-                                print(f"Stochastic: %K={k:.2f}, %D={d:.2f}")
-
-                            if 'ema' in analysis:
-                                print("지수이동평균선:")
-                                for period, value in analysis['ema'].items():
-                                    print(f"  EMA{period}: {value:,.0f}")
-
-                            if 'dmi' in analysis and all(x is not None for x in analysis['dmi']):
-                                plus_di, minus_di, adx = analysis['dmi']
-                                print(f"DMI: +DI={plus_di:.2f}, -DI={minus_di:.2f}, ADX={adx:.2f}")
-
-                            if 'mfi' in analysis:
-                                print(f"MFI: {analysis['mfi']:.2f}")
-
-                            if 'williams_r' in analysis:
-                                print(f"Williams %R: {analysis['williams_r']:.2f}")
-
-                            if 'cci' in analysis:
-                                print(f"CCI: {analysis['cci']:.2f}")
-                
+                if not market_data:
+                    raise RuntimeError("시장 데이터 수집 실패")
+                fail_count = 0
+                print(f"\n{market_data['timestamp']} - 데이터 수집 및 분석 완료")
+                print(f"현재가: {market_data['current_price']:,.0f} KRW")
+
+                # 변동률 출력
+                print("\n각 시간대별 변동률:")
+                for timeframe in ['1m', '3m', '5m', '10m', '15m', '30m', '24h']:
+                    if timeframe in market_data['analysis']:
+                        print(f"{timeframe}: {market_data['analysis'][timeframe]['change_rate']:.2f}%")
+
+                # 기술적 지표 출력
+                for timeframe in ['1m', '3m', '5m', '10m', '15m', '30m']:
+                    if timeframe in market_data['analysis']:
+                        analysis = market_data['analysis'][timeframe]
+                        print(f"\n{timeframe} 기술적 지표:")
+
+                        if 'rsi' in analysis:
+                            print(f"RSI(14): {analysis['rsi']:.2f}")
+
+                        if 'bollinger_bands' in analysis and all(x is not None for x in analysis['bollinger_bands']):
+                            bb = analysis['bollinger_bands']
+                            print(f"볼린저 밴드: {bb[0]:,.0f} / {bb[1]:,.0f} / {bb[2]:,.0f}")
+
+                        if 'moving_averages' in analysis:
+                            print("이동평균선:")
+                            for period, value in analysis['moving_averages'].items():
+                                print(f"  MA{period}: {value:,.0f}")
+
+                        if 'stochastic' in analysis and all(x is not None for x in analysis['stochastic']):
+                            k, d = analysis['stochastic']
+                            print(f"Stochastic: %K={k:.2f}, %D={d:.2f}")
+
+                        if 'ema' in analysis:
+                            print("지수이동평균선:")
+                            for period, value in analysis['ema'].items():
+                                print(f"  EMA{period}: {value:,.0f}")
+
+                        if 'dmi' in analysis and all(x is not None for x in analysis['dmi']):
+                            plus_di, minus_di, adx = analysis['dmi']
+                            print(f"DMI: +DI={plus_di:.2f}, -DI={minus_di:.2f}, ADX={adx:.2f}")
+
+                        if 'mfi' in analysis:
+                            print(f"MFI: {analysis['mfi']:.2f}")
+
+                        if 'williams_r' in analysis:
+                            print(f"Williams %R: {analysis['williams_r']:.2f}")
+
+                        if 'cci' in analysis:
+                            print(f"CCI: {analysis['cci']:.2f}")
+
                 time.sleep(interval)
                 
             except Exception as e:
+                fail_count += 1
+                # 장애가 이어지면 대기 시간을 두 배씩 늘려 API 호출이 몰리지 않도록 함
+                retry_seconds = min(max_retry_seconds, 60 * 2 ** (fail_count - 1)) + random.uniform(0, 5)
                 print(f"봇 실행 중 오류 발생: {e}")
-                print("1분 후 재시도")
-                time.sleep(60)
+                print(f"연속 {fail_count}회 실패 - {retry_seconds:.0f}초 후 재시도")
+                time.sleep(retry_seconds)
 
 if __name__ == "__main__":
     trader = UpbitTrader()